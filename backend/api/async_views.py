@@ -0,0 +1,172 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial, wraps
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler as BaseASGIHandler
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+# Конец потокового ответа в очереди ASGIHandler.send_streaming
+END = object()
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """Пул потоков для синхронного кода асинхронных view."""
+    return ThreadPoolExecutor(
+        max_workers=settings.ASYNC_VIEW_WORKERS,
+        thread_name_prefix='async-views',
+    )
+
+
+def run_in_executor(function, *args):
+    """Выполняет function в пуле с копией контекста (метрики запроса)."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return loop.run_in_executor(
+        get_executor(), partial(context.run, function, *args)
+    )
+
+
+def call_view(view, request, *args, **kwargs):
+    """
+    Выполняет view в потоке пула. Ответ DRF рендерится здесь же, тело
+    потокового ответа читает ASGIHandler.send_streaming.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """
+    Асинхронная обертка синхронного view. В Django 3.2 нет асинхронного
+    ORM, а в DRF асинхронных view, поэтому сам view выполняется в пуле
+    из ASYNC_VIEW_WORKERS потоков. Чтение тела запроса и отдача ответа
+    медленному клиенту идут в цикле событий и не занимают поток.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_in_executor(
+            partial(call_view, view, request, *args, **kwargs)
+        )
+
+    return wrapper
+
+
+def make_async(urlpatterns, names=None):
+    """
+    Заменяет view маршрутов names (по умолчанию всех) на асинхронные
+    обертки. Синхронные view без обертки Django под ASGI выполняет
+    в одном общем потоке (sync_to_async с thread_sensitive=True),
+    и такие запросы идут строго по одному.
+    """
+    return [
+        URLPattern(
+            url.pattern, async_view(url.callback), url.default_args, url.name
+        ) if names is None or getattr(url, 'name', None) in names else url
+        for url in urlpatterns
+    ]
+
+
+class ASGIHandler(BaseASGIHandler):
+    """
+    ASGIHandler, который читает тело потоковых ответов в пуле потоков.
+    Генераторы потоковых ответов (список покупок, выгрузка рецептов)
+    обращаются к БД, а Django 3.2 перебирает их в цикле событий, где
+    это запрещено. Части тела собираются в куски по chunk_size байт,
+    между потоком и циклом событий не больше ASYNC_STREAM_BUFFER кусков:
+    память на ответ ограничена, как под WSGI, но поток пула занят, пока
+    клиент не дочитает ответ до последних ASYNC_STREAM_BUFFER кусков.
+    """
+    async def send_response(self, response, send):
+        if response.streaming:
+            await self.send_streaming(response, send)
+        else:
+            await super().send_response(response, send)
+
+    @staticmethod
+    def get_headers(response):
+        headers = [
+            (header.encode('ascii'), value.encode('latin1'))
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        return headers
+
+    def produce(self, response, chunks, stopped, loop):
+        """Перебирает ответ в потоке пула и кладет куски в очередь."""
+        def put(item):
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        close_old_connections()
+        try:
+            buffer = []
+            size = 0
+            # Через __iter__, а не streaming_content, как в Django
+            for part in response:
+                buffer.append(part)
+                size += len(part)
+                if size >= self.chunk_size:
+                    if stopped.is_set():
+                        return
+                    put(b''.join(buffer))
+                    buffer = []
+                    size = 0
+            if buffer and not stopped.is_set():
+                put(b''.join(buffer))
+        finally:
+            close_old_connections()
+            if not stopped.is_set():
+                put(END)
+
+    async def send_streaming(self, response, send):
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': self.get_headers(response),
+        })
+        chunks = asyncio.Queue(maxsize=settings.ASYNC_STREAM_BUFFER)
+        stopped = threading.Event()
+        producer = run_in_executor(
+            self.produce, response, chunks, stopped,
+            asyncio.get_running_loop()
+        )
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is END:
+                    break
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        finally:
+            # Если клиент отключился, поток не должен ждать места в очереди
+            stopped.set()
+            while not chunks.empty():
+                chunks.get_nowait()
+        # Исключение генератора ответа поднимается здесь
+        await producer
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application():
+    """django.core.asgi.get_asgi_application с ASGIHandler выше."""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
@@ -0,0 +1,176 @@
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from recipe.images import schedule_image_variants
+from recipe.models import Component, Ingredient, Recipe, RecipeTag
+from recipe.search import schedule_search_update
+from users.models import User
+
+from .cache import get_tags
+from .serializers import RecipeImportSerializer
+from .utils import update_counters
+
+
+class RecipeImporter:
+    """
+    Пакетный импорт рецептов из NDJSON (один рецепт в строке, формат как
+    у POST /api/recipes/). Строки проверяются пачками: ингредиенты
+    одним запросом на пачку, теги по кэшу. Каждая пачка пишется в своей
+    транзакции через bulk_create. Ошибочные строки пропускаются и
+    попадают в отчет с номером строки, строки не в кодировке запроса
+    приходят от NDJSONParser как None. Имена файлов вместо картинок
+    в base64 принимаются только при allow_image_names (import_recipes).
+    """
+    def __init__(self, author, batch_size=500, allow_image_names=False):
+        self.author = author
+        self.batch_size = batch_size
+        self.allow_image_names = allow_image_names
+        self.created = 0
+        self.errors = []
+
+    def run(self, lines):
+        numbered = (
+            (number, line)
+            for number, line in enumerate(lines, start=1)
+            if line is None or line.strip()
+        )
+        while True:
+            batch = list(islice(numbered, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+        self.errors.sort(key=lambda error: error['line'])
+        return {'created': self.created, 'errors': self.errors}
+
+    def add_error(self, number, errors):
+        self.errors.append({'line': number, 'errors': errors})
+
+    def parse(self, batch):
+        parsed = []
+        for number, line in batch:
+            if line is None:
+                self.add_error(number, 'Некорректная кодировка строки')
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                self.add_error(number, 'Некорректный JSON')
+                continue
+            serializer = RecipeImportSerializer(data=data, context={
+                'allow_image_names': self.allow_image_names,
+            })
+            if serializer.is_valid():
+                parsed.append((number, serializer.validated_data))
+            else:
+                self.add_error(number, serializer.errors)
+        return parsed
+
+    def check_references(self, parsed):
+        ingredient_ids = {
+            ingredient['ingredient_id']
+            for _, data in parsed
+            for ingredient in data['ingredients']
+        }
+        existing_ingredients = set(Ingredient.objects.filter(
+            id__in=ingredient_ids
+        ).values_list('id', flat=True))
+        _, tags = get_tags()
+        existing_tags = {tag.id for tag in tags}
+
+        checked = []
+        for number, data in parsed:
+            missing_ingredients = {
+                ingredient['ingredient_id']
+                for ingredient in data['ingredients']
+            } - existing_ingredients
+            missing_tags = set(data['tags']) - existing_tags
+            if missing_ingredients or missing_tags:
+                self.add_error(number, {
+                    'ingredients': sorted(missing_ingredients),
+                    'tags': sorted(missing_tags),
+                })
+                continue
+            checked.append(data)
+        return checked
+
+    @staticmethod
+    def save_recipes(recipes):
+        # Без RETURNING (например, SQLite) id после bulk_create неизвестны
+        if connection.features.can_return_rows_from_bulk_insert:
+            return Recipe.objects.bulk_create(recipes)
+        for recipe in recipes:
+            recipe.save()
+        return recipes
+
+    def import_batch(self, batch):
+        checked = self.check_references(self.parse(batch))
+        if not checked:
+            return
+
+        with transaction.atomic():
+            recipes = self.save_recipes([
+                Recipe(
+                    author=self.author,
+                    name=data['name'],
+                    text=data['text'],
+                    cooking_time=data['cooking_time'],
+                    image=data['image'],
+                )
+                for data in checked
+            ])
+            Component.objects.bulk_create([
+                Component(
+                    recipe=recipe,
+                    ingredient_id=ingredient['ingredient_id'],
+                    amount=ingredient['amount'],
+                )
+                for recipe, data in zip(recipes, checked)
+                for ingredient in data['ingredients']
+            ])
+            RecipeTag.objects.bulk_create([
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for recipe, data in zip(recipes, checked)
+                for tag_id in set(data['tags'])
+            ])
+            update_counters(User, self.author.id, recipes_count=len(recipes))
+            schedule_search_update([recipe.id for recipe in recipes])
+            for recipe in recipes:
+                schedule_image_variants(recipe)
+
+        for data in checked:
+            if hasattr(data['image'], 'close'):
+                data['image'].close()
+        self.created += len(recipes)
+
+
+def export_recipes(queryset, batch_size=500):
+    """
+    Отдает рецепты словарями в формате импорта, выбирая их пачками
+    по возрастанию id, чтобы не держать всю выборку в памяти.
+    """
+    last_id = 0
+    while True:
+        batch = list(
+            queryset.filter(id__gt=last_id).order_by('id').prefetch_related(
+                'tags', 'components'
+            )[:batch_size]
+        )
+        if not batch:
+            return
+        for recipe in batch:
+            yield {
+                'id': recipe.id,
+                'author': recipe.author_id,
+                'name': recipe.name,
+                'image': recipe.image.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'tags': [tag.id for tag in recipe.tags.all()],
+                'ingredients': [
+                    {'id': component.ingredient_id,
+                     'amount': component.amount}
+                    for component in recipe.components.all()
+                ],
+            }
+        last_id = batch[-1].id
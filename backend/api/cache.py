@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from recipe.models import Ingredient, Tag
+
+
+class ReferenceCache:
+    """
+    Кэш редко меняющихся справочников (теги, ингредиенты).
+    Для каждой модели в общем кэше Django хранится метка версии, которая
+    меняется при сохранении/удалении объектов (см. api.signals). Данные
+    лежат в общем кэше под ключом версии и дублируются в локальном LRU
+    процесса, так что при неизменной версии обращения к БД нет.
+    Если кэш Django локален для процесса (LocMemCache), метка версии
+    истекает через REFERENCE_CACHE_LOCAL_TIMEOUT секунд, и правки из
+    других процессов подхватываются не позже этого срока.
+    """
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_version_key(model):
+        return f'reference:{model._meta.label_lower}:version'
+
+    @staticmethod
+    def get_version_timeout():
+        if isinstance(caches['default'], LocMemCache):
+            return settings.REFERENCE_CACHE_LOCAL_TIMEOUT
+        return None
+
+    def get_version(self, model):
+        key = self.get_version_key(model)
+        version = cache.get(key)
+        if version is None:
+            # add не перезапишет версию, выставленную другим процессом
+            version = uuid4().hex
+            cache.add(key, version, timeout=self.get_version_timeout())
+            return cache.get(key, version)
+        return version
+
+    def invalidate(self, model):
+        cache.set(self.get_version_key(model), uuid4().hex,
+                  timeout=self.get_version_timeout())
+
+    def get(self, model, name, loader):
+        """
+        Возвращает пару (версия, значение) для справочника model.
+        loader вызывается, только если значения нет ни в одном из кэшей.
+        """
+        version = self.get_version(model)
+        local_key = (model._meta.label_lower, name)
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is not None and entry[0] == version:
+                self._local.move_to_end(local_key)
+                return entry
+
+        shared_key = f'reference:{model._meta.label_lower}:{name}:{version}'
+        value = cache.get(shared_key)
+        if value is None:
+            value = loader()
+            cache.set(shared_key, value, timeout=self.get_version_timeout())
+
+        with self._lock:
+            self._local[local_key] = (version, value)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+        return version, value
+
+
+reference_cache = ReferenceCache()
+
+
+def get_tags():
+    return reference_cache.get(Tag, 'list', lambda: list(Tag.objects.all()))
+
+
+def get_tag_slugs():
+    """Возвращает (версия, {slug: id}) для фильтрации по тегам."""
+    return reference_cache.get(Tag, 'slugs', lambda: dict(
+        Tag.objects.values_list('slug', 'id')
+    ))
+
+
+def get_ingredients():
+    return reference_cache.get(
+        Ingredient, 'list', lambda: list(Ingredient.objects.all())
+    )
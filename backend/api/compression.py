@@ -0,0 +1,86 @@
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+from .metrics import timer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+# Быстрый уровень brotli: на ответах API сжимает не хуже gzip -6
+BROTLI_QUALITY = 4
+
+re_accepts_br = re.compile(r'\bbr\b')
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def get_encoding(request, streaming):
+    """Кодировка сжатия, которую принимает клиент, или None."""
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    # Потоковые ответы сжимаются только gzip (compress_sequence)
+    if brotli is not None and not streaming and re_accepts_br.search(
+            accepted):
+        return 'br'
+    if re_accepts_gzip.search(accepted):
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return compress_string(content)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Сжимает JSON и текстовые ответы от COMPRESSION_MIN_SIZE байт:
+    brotli, если модуль установлен и клиент его принимает, иначе gzip.
+    Потоковые ответы (список покупок, выгрузка рецептов) сжимаются gzip
+    по частям. Сильный ETag становится слабым, как в GZipMiddleware:
+    условные запросы сравнивают ETag без учета W/.
+    """
+    @staticmethod
+    def should_compress(response):
+        if response.has_header('Content-Encoding'):
+            return False
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        return (
+            response.streaming
+            or len(response.content) >= settings.COMPRESSION_MIN_SIZE
+        )
+
+    def process_response(self, request, response):
+        if not self.should_compress(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = get_encoding(request, response.streaming)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(
+                response.streaming_content)
+            del response['Content-Length']
+        else:
+            with timer('compress'):
+                content = compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,134 @@
+from operator import attrgetter
+
+from .serializers import get_variant_urls
+
+
+def get_file_url(file, request=None):
+    """Ссылка на файл, как FileField.to_representation в DRF."""
+    if not file:
+        return None
+    try:
+        url = file.url
+    except AttributeError:
+        return None
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def get_tag(tag):
+    return {
+        'id': tag.id,
+        'name': tag.name,
+        'color': tag.color,
+        'slug': tag.slug,
+    }
+
+
+def get_component(component):
+    ingredient = component.ingredient
+    return {
+        'id': ingredient.id,
+        'name': ingredient.name,
+        'measurement_unit': ingredient.measurement_unit,
+        'amount': component.amount,
+    }
+
+
+def get_author(author):
+    return {
+        'email': author.email,
+        'id': author.id,
+        'username': author.username,
+        'first_name': author.first_name,
+        'last_name': author.last_name,
+        'is_subscribed': author.is_subscribed,
+    }
+
+
+class FastSerializer:
+    """
+    Сериализатор только для чтения с интерфейсом DRF (instance, many,
+    context, data). Поля - пары (ключ, функция от объекта), собранные
+    один раз на сериализатор: без экземпляров полей DRF, get_attribute
+    и OrderedDict на каждый объект. JSON совпадает с обычным
+    сериализатором, это проверяет команда benchmark_serializers.
+    """
+    def __init__(self, instance=None, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.getters = self.get_getters()
+
+    def get_getters(self):
+        raise NotImplementedError(
+            'Метод get_getters() должен быть переопределен')
+
+    def to_representation(self, obj):
+        return {key: getter(obj) for key, getter in self.getters}
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(obj) for obj in self.instance]
+        return self.to_representation(self.instance)
+
+
+class FastRecipeListSerializer(FastSerializer):
+    """
+    RecipeListSerializer для рецептов из Recipe.objects.with_related:
+    флаги пользователя, автор, теги и компоненты уже выбраны.
+    """
+    def get_getters(self):
+        request = self.context.get('request')
+        return (
+            ('id', attrgetter('id')),
+            ('tags', lambda recipe: [
+                get_tag(tag) for tag in recipe.tags.all()]),
+            ('author', lambda recipe: get_author(recipe.author)),
+            ('ingredients', lambda recipe: [
+                get_component(component)
+                for component in recipe.components.all()]),
+            ('is_favorited', attrgetter('is_favorited')),
+            ('is_in_shopping_cart', attrgetter('is_in_shopping_cart')),
+            ('name', attrgetter('name')),
+            ('image', lambda recipe: get_file_url(recipe.image, request)),
+            ('images', lambda recipe: get_variant_urls(
+                recipe.image_variants, request)),
+            ('text', attrgetter('text')),
+            ('cooking_time', attrgetter('cooking_time')),
+        )
+
+
+class FastSubscribeSerializer(FastSerializer):
+    """
+    SubscribeSerializer для страницы подписок: рецепты авторов переданы
+    в context['recipes_by_author']. Ссылки на картинки рецептов, как и
+    в RecipeForSubscribeSerializer, относительные.
+    """
+    @staticmethod
+    def get_recipe(recipe):
+        return {
+            'id': recipe.id,
+            'name': recipe.name,
+            'cooking_time': recipe.cooking_time,
+            'image': get_file_url(recipe.image),
+            'images': get_variant_urls(recipe.image_variants),
+        }
+
+    def get_getters(self):
+        user_id = self.context['request'].user.id
+        recipes_by_author = self.context['recipes_by_author']
+        return (
+            ('email', attrgetter('author.email')),
+            ('id', attrgetter('author.id')),
+            ('username', attrgetter('author.username')),
+            ('first_name', attrgetter('author.first_name')),
+            ('last_name', attrgetter('author.last_name')),
+            ('is_subscribed', lambda subscribe: subscribe.user_id == user_id),
+            ('recipes', lambda subscribe: [
+                self.get_recipe(recipe)
+                for recipe in recipes_by_author.get(subscribe.author_id, [])
+            ]),
+            ('recipes_count', attrgetter('author.recipes_count')),
+        )
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.cache import cache
+from recipe.models import Recipe
+from users.models import Subscribe
+
+
+def get_timeline_key(user_id):
+    return f'feed:{user_id}:timeline'
+
+
+def build_timeline(user):
+    """
+    Последние FEED_CACHE_SIZE рецептов ленты [(pub_date, id), ...] или
+    False, если подписок мало и лента быстро выбирается из БД.
+    """
+    following = Subscribe.objects.filter(user=user).count()
+    if following < settings.FEED_CACHE_MIN_FOLLOWING:
+        return False
+    return list(Recipe.objects.from_followed(user).order_by(
+        '-pub_date', '-id'
+    ).values_list('pub_date', 'id')[:settings.FEED_CACHE_SIZE])
+
+
+def get_timeline(user):
+    """
+    Закэшированная лента пользователя с большим числом подписок или None.
+    Новые рецепты попадают в ленту не позже чем через FEED_CACHE_TIMEOUT,
+    изменение подписок сбрасывает кэш сразу (invalidate_timeline).
+    """
+    key = get_timeline_key(user.id)
+    timeline = cache.get(key)
+    if timeline is None:
+        timeline = build_timeline(user)
+        cache.set(key, timeline, timeout=settings.FEED_CACHE_TIMEOUT)
+    return timeline or None
+
+
+def invalidate_timeline(user_id):
+    cache.delete(get_timeline_key(user_id))
@@ -1,7 +1,22 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from recipe.models import Ingredient, Recipe, Tag
+from recipe.models import Ingredient, Recipe, RecipeTag
 from users.models import User
 
+from .cache import get_tag_slugs
+from .search import search_recipes
+
+# Порядок для ?ordering=: поля рейтингов пересчитывает refresh_recipe_scores
+RECIPE_ORDERINGS = {
+    'popular': ('-popularity_score', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
+
+
+def tag_choices():
+    _, slugs = get_tag_slugs()
+    return [(slug, slug) for slug in slugs]
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(field_name="name", lookup_expr='icontains')
@@ -14,26 +29,47 @@ class IngredientFilter(FilterSet):
 class RecipeFilter(FilterSet):
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all())
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags',
     )
     is_in_shopping_cart = filters.NumberFilter(
         method='filter_is_in_shopping_cart')
     is_favorited = filters.NumberFilter(
         method='filter_is_favorited')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(ordering, ordering) for ordering in RECIPE_ORDERINGS],
+        method='filter_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        # search раньше ordering: явный порядок важнее релевантности
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
+
+    def filter_tags(self, queryset, name, value):
+        # Слаги проверены и переведены в id по кэшу, без запроса к Tag
+        # EXISTS по таблице связи не размножает рецепты, DISTINCT не нужен
+        _, slugs = get_tag_slugs()
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[slugs[slug] for slug in value]
+        )))
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorite__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(shopping_cart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
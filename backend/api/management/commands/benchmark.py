@@ -0,0 +1,261 @@
+import json
+import time
+import tracemalloc
+from math import ceil
+
+from api.filters import RECIPE_ORDERINGS
+from api.metrics import RequestMetrics
+from api.pagination import RecipeCursorPagination
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from recipe.models import Component, Favorite, Recipe, ShoppingCart, Tag
+from rest_framework.test import APIClient
+from users.models import Subscribe, User
+
+# Глубокая страница списка рецептов для сравнения page= и cursor=.
+# Если рецептов меньше, берется последняя страница
+DEEP_PAGE = 500
+# Сценарий: (название, путь, параметры, от имени пользователя).
+# В параметрах подставляются значения из get_context
+SCENARIOS = (
+    ('recipes-list anonymous', '/api/recipes/', {}, False),
+    ('recipes-list', '/api/recipes/', {}, True),
+    ('recipes-list tags', '/api/recipes/', {'tags': '{tag}'}, True),
+    ('recipes-list author', '/api/recipes/', {'author': '{author}'}, True),
+    ('recipes-list is_favorited', '/api/recipes/',
+     {'is_favorited': '1'}, True),
+    ('recipes-list is_in_shopping_cart', '/api/recipes/',
+     {'is_in_shopping_cart': '1'}, True),
+    ('recipes-list search', '/api/recipes/', {'search': '{word}'}, True),
+    ('recipes-list popular', '/api/recipes/', {'ordering': 'popular'}, True),
+    ('recipes-list page 1', '/api/recipes/', {'page': '1'}, True),
+    (f'recipes-list page {DEEP_PAGE}', '/api/recipes/',
+     {'page': '{deep_page}'}, True),
+    ('recipes-list cursor 1', '/api/recipes/', {'cursor': ''}, True),
+    (f'recipes-list cursor {DEEP_PAGE}', '/api/recipes/',
+     {'cursor': '{deep_cursor}'}, True),
+    (f'recipes-list popular page {DEEP_PAGE}', '/api/recipes/',
+     {'ordering': 'popular', 'page': '{deep_page}'}, True),
+    (f'recipes-list popular cursor {DEEP_PAGE}', '/api/recipes/',
+     {'ordering': 'popular', 'cursor': '{deep_popular_cursor}'}, True),
+    ('recipes-feed', '/api/recipes/feed/', {}, True),
+    ('download-shopping-cart', '/api/recipes/download_shopping_cart/',
+     {}, True),
+    ('users-subscriptions', '/api/users/subscriptions/',
+     {'recipes_limit': '3'}, True),
+    ('ingredients search', '/api/ingredients/', {'name': '{prefix}'}, False),
+)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(round(q * (len(values) - 1))), len(values) - 1)]
+
+
+def get_dataset():
+    """Размер набора данных, с которым сняты замеры."""
+    return {
+        'database': connection.vendor,
+        'users': User.objects.count(),
+        'recipes': Recipe.objects.count(),
+        'components': Component.objects.count(),
+        'favorites': Favorite.objects.count(),
+        'shopping_cart': ShoppingCart.objects.count(),
+        'subscriptions': Subscribe.objects.count(),
+    }
+
+
+def get_context():
+    """Значения для параметров сценариев из текущей БД."""
+    author = User.objects.order_by('-recipes_count', 'id').first()
+    tag = Tag.objects.order_by('id').first()
+    ingredient = Component.objects.values('ingredient__name').annotate(
+        total=Count('id')
+    ).order_by('-total', 'ingredient__name').first()
+    if author is None or tag is None or ingredient is None:
+        raise CommandError(
+            'Недостаточно данных, запустите generate_fake_data')
+    name = ingredient['ingredient__name']
+    return {
+        'author': author.id,
+        'tag': tag.slug,
+        'word': max(name.split(), key=len),
+        'prefix': name[:3],
+        **get_deep_page_context(),
+    }
+
+
+def get_deep_page_context():
+    """
+    Номер глубокой страницы и курсоры, ведущие на ту же страницу
+    в порядке по умолчанию и по популярности.
+    """
+    pagination = RecipeCursorPagination()
+    last_page = max(
+        ceil(Recipe.objects.count() / pagination.page_size), 1
+    )
+    deep_page = min(DEEP_PAGE, last_page)
+    context = {'deep_page': deep_page}
+    for name, ordering in (('deep_cursor', pagination.ordering),
+                           ('deep_popular_cursor',
+                            RECIPE_ORDERINGS['popular'])):
+        context[name] = ''
+        if deep_page > 1:
+            recipe = Recipe.objects.order_by(*ordering)[
+                (deep_page - 1) * pagination.page_size - 1
+            ]
+            context[name] = pagination.get_cursor(recipe, ordering)
+    return context
+
+
+class Command(BaseCommand):
+    help = ('Замеряет горячие эндпоинты через тестовый клиент DRF: '
+            'число запросов к БД, p50/p95 времени ответа и пик выделенной '
+            'памяти. Сравнивает результат с сохраненным JSON-базисом.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', default='fake0',
+            help='Никнейм пользователя, от имени которого идут запросы.',
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=50,
+            help='Количество замеров времени на сценарий.',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Количество прогревочных запросов на сценарий.',
+        )
+        parser.add_argument(
+            '--only', default='',
+            help='Запускать только сценарии, в названии которых есть строка.',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON-базис: отметить регрессии относительно него.',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            help='Сохранить результаты как JSON-базис.',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help='Допустимый рост p50 и памяти относительно базиса.',
+        )
+
+    def request(self, client, path, params):
+        response = client.get(path, params)
+        if response.status_code != 200:
+            raise CommandError(
+                f'{path} {params}: статус {response.status_code}')
+        # Потоковые ответы (список покупок) тоже читаются целиком
+        return response.getvalue()
+
+    def measure(self, client, path, params, options):
+        for _ in range(options['warmup']):
+            self.request(client, path, params)
+
+        # При DEBUG connection.queries_log переполняется, поэтому запросы
+        # считаются своей оберткой, как в metrics_middleware
+        metrics = RequestMetrics()
+        with connection.execute_wrapper(metrics):
+            body = self.request(client, path, params)
+
+        # tracemalloc замедляет выполнение, поэтому отдельный запрос
+        tracemalloc.start()
+        self.request(client, path, params)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        timings = []
+        for _ in range(options['iterations']):
+            started = time.perf_counter()
+            self.request(client, path, params)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        return {
+            'queries': metrics.query_count,
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'alloc_kib': round(peak / 1024),
+            'bytes': len(body),
+        }
+
+    @staticmethod
+    def find_regressions(name, result, base, tolerance):
+        if result['queries'] > base['queries']:
+            yield (f'{name}: запросов к БД {result["queries"]} '
+                   f'(было {base["queries"]})')
+        # p95 на десятках замеров шумит, время сравнивается по p50
+        for field in ('p50_ms', 'alloc_kib'):
+            if result[field] > base[field] * (1 + tolerance):
+                yield f'{name}: {field} {result[field]} (было {base[field]})'
+
+    def load_baseline(self, path, dataset):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline['dataset'] != dataset:
+            self.stderr.write(
+                f'Набор данных отличается от базиса: {baseline["dataset"]}, '
+                f'сейчас {dataset}. Сравнение может быть неточным.'
+            )
+        return baseline['results']
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f'Пользователь {options["user"]} не найден')
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_authenticate(user)
+
+        dataset = get_dataset()
+        context = get_context()
+        baseline = {}
+        if options['baseline']:
+            baseline = self.load_baseline(options['baseline'], dataset)
+
+        self.stdout.write(f'Набор данных: {dataset}')
+        self.stdout.write(
+            f'{"Сценарий":<34} {"SQL":>4} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"Пик, КиБ":>9} {"p50 к базису":>13}'
+        )
+        results = {}
+        regressions = []
+        for name, path, params, is_authenticated in SCENARIOS:
+            if options['only'] not in name:
+                continue
+            params = {
+                key: value.format(**context) for key, value in params.items()
+            }
+            result = results[name] = self.measure(
+                authenticated if is_authenticated else anonymous,
+                path, params, options
+            )
+            base = baseline.get(name)
+            change = ''
+            if base:
+                change = f'{result["p50_ms"] / base["p50_ms"] - 1:+.0%}'
+                regressions.extend(self.find_regressions(
+                    name, result, base, options['tolerance']
+                ))
+            self.stdout.write(
+                f'{name:<34} {result["queries"]:>4} '
+                f'{result["p50_ms"]:>9.1f} {result["p95_ms"]:>9.1f} '
+                f'{result["alloc_kib"]:>9} {change:>13}'
+            )
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {'dataset': dataset, 'results': results},
+                    file, ensure_ascii=False, indent=2, sort_keys=True
+                )
+            self.stdout.write(f'Базис сохранен в {options["save_baseline"]}')
+
+        for regression in regressions:
+            self.stderr.write(regression)
+        if regressions:
+            raise CommandError(f'Регрессий: {len(regressions)}')
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,295 @@
+import asyncio
+import base64
+import json
+import sys
+import threading
+import time
+from io import BytesIO
+
+from api.async_views import ASGIHandler
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from recipe.models import Recipe
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .benchmark import percentile
+
+# Сценарий: (метод, путь, строка запроса). Тело запроса - из get_body
+SCENARIOS = {
+    'list': ('GET', '/api/recipes/', 'limit=50'),
+    'download': ('GET', '/api/recipes/download_shopping_cart/', ''),
+    'upload': ('PATCH', '/api/recipes/{recipe}/', ''),
+    'tags': ('GET', '/api/tags/', ''),
+    'subscriptions': ('GET', '/api/users/subscriptions/', ''),
+}
+# Смешанная нагрузка: клиенты по очереди берут эти сценарии
+MIXED = ('list', 'download', 'tags', 'subscriptions')
+CHUNK_SIZE = 64 * 1024
+
+
+def get_image(size):
+    """Картинка рецепта в base64, как ее присылает фронтенд."""
+    content = BytesIO()
+    Image.effect_noise((size, size), 64).convert('RGB').save(
+        content, 'JPEG', quality=90)
+    encoded = base64.b64encode(content.getvalue()).decode()
+    return f'data:image/jpeg;base64,{encoded}'
+
+
+def get_transfer_time(size, rate):
+    """Сколько секунд клиент со скоростью rate байт/с передает size байт."""
+    return size / rate if rate else 0
+
+
+class SlowInput:
+    """wsgi.input медленного клиента: чтение ждет, пока придут данные."""
+    def __init__(self, body, rate):
+        self.body = BytesIO(body)
+        self.rate = rate
+
+    def read(self, size=-1):
+        chunk = self.body.read(size)
+        time.sleep(get_transfer_time(len(chunk), self.rate))
+        return chunk
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность WSGI (синхронные воркеры, '
+            'как gunicorn) и ASGI (api.async_views) при медленных '
+            'клиентах. Обработчики Django вызываются в процессе, клиенты '
+            'отправляют тело запроса и читают ответ со скоростью --rate. '
+            'Режим ASGI требует ASYNC_VIEWS=True, WSGI - ASYNC_VIEWS=False.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=('wsgi', 'asgi'), required=True,
+            help='Какой обработчик Django нагружать.',
+        )
+        parser.add_argument(
+            '--scenario', choices=sorted((*SCENARIOS, 'mixed')),
+            default='list',
+            help='list - список рецептов, download - список покупок, '
+                 'upload - замена картинки рецепта, tags - теги, '
+                 'subscriptions - подписки, mixed - клиенты поровну '
+                 'на list, download, tags и subscriptions.',
+        )
+        parser.add_argument(
+            '--user', default='fake0',
+            help='Никнейм пользователя, от имени которого идут запросы.',
+        )
+        parser.add_argument(
+            '--clients', type=int, default=32,
+            help='Число одновременных клиентов.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=4,
+            help='Запросов от каждого клиента подряд.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число синхронных воркеров WSGI (gunicorn в Dockerfile '
+                 'запущен с одним). В режиме ASGI размер пула потоков '
+                 'задает ASYNC_VIEW_WORKERS.',
+        )
+        parser.add_argument(
+            '--rate', type=int, default=64 * 1024,
+            help='Скорость клиента в байтах в секунду, 0 - без задержек.',
+        )
+        parser.add_argument(
+            '--image-size', type=int, default=400,
+            help='Сторона картинки в сценарии upload, пикселей.',
+        )
+
+    def get_body(self, scenario, recipe, options):
+        if scenario != 'upload':
+            return b''
+        return json.dumps({
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'tags': [tag.id for tag in recipe.tags.all()],
+            'ingredients': [
+                {'id': component.ingredient_id, 'amount': component.amount}
+                for component in recipe.components.all()
+            ],
+            'image': get_image(options['image_size']),
+        }).encode()
+
+    def get_request(self, scenario, user, recipe, options):
+        method, path, query = SCENARIOS[scenario]
+        return (
+            method,
+            path.format(recipe=recipe.id if recipe else None),
+            query,
+            self.get_body(scenario, recipe, options),
+            Token.objects.get_or_create(user=user)[0].key,
+        )
+
+    def run_wsgi(self, requests, options):
+        """Клиенты в потоках, обработка - не больше --workers сразу."""
+        handler = WSGIHandler()
+        workers = threading.BoundedSemaphore(options['workers'])
+        statuses = []
+        latencies = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+
+        def client(request):
+            method, path, query, body, token = request
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                # Синхронный воркер занят, пока клиент не получит ответ
+                with workers:
+                    response = handler({
+                        'REQUEST_METHOD': method,
+                        'PATH_INFO': path,
+                        'QUERY_STRING': query,
+                        'SCRIPT_NAME': '',
+                        'SERVER_NAME': 'localhost',
+                        'SERVER_PORT': '80',
+                        'SERVER_PROTOCOL': 'HTTP/1.1',
+                        'HTTP_HOST': 'localhost',
+                        'HTTP_AUTHORIZATION': f'Token {token}',
+                        'CONTENT_TYPE': 'application/json',
+                        'CONTENT_LENGTH': str(len(body)),
+                        'wsgi.input': SlowInput(body, options['rate']),
+                        'wsgi.errors': sys.stderr,
+                        'wsgi.url_scheme': 'http',
+                        'wsgi.version': (1, 0),
+                        'wsgi.multithread': True,
+                        'wsgi.multiprocess': True,
+                        'wsgi.run_once': False,
+                    }, start_response)
+                    try:
+                        for chunk in response:
+                            time.sleep(get_transfer_time(
+                                len(chunk), options['rate']))
+                    finally:
+                        response.close()
+                latencies.append(time.perf_counter() - started)
+
+        threads = [
+            threading.Thread(
+                target=client, args=(requests[index % len(requests)],))
+            for index in range(options['clients'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses, latencies
+
+    async def run_asgi(self, requests, options):
+        """Клиенты - корутины, ожидание клиента не занимает поток."""
+        handler = ASGIHandler()
+        statuses = []
+        latencies = []
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+            else:
+                await asyncio.sleep(get_transfer_time(
+                    len(message.get('body', b'')), options['rate']))
+
+        async def client(request):
+            method, path, query, body, token = request
+            for _ in range(options['requests']):
+                chunks = [
+                    body[start:start + CHUNK_SIZE]
+                    for start in range(0, len(body), CHUNK_SIZE)
+                ] or [b'']
+
+                async def receive():
+                    chunk = chunks.pop(0)
+                    await asyncio.sleep(
+                        get_transfer_time(len(chunk), options['rate']))
+                    return {
+                        'type': 'http.request',
+                        'body': chunk,
+                        'more_body': bool(chunks),
+                    }
+
+                started = time.perf_counter()
+                await handler({
+                    'type': 'http',
+                    'asgi': {'version': '3.0'},
+                    'http_version': '1.1',
+                    'method': method,
+                    'scheme': 'http',
+                    'path': path,
+                    'raw_path': path.encode(),
+                    'query_string': query.encode(),
+                    'root_path': '',
+                    'headers': [
+                        (b'host', b'localhost'),
+                        (b'authorization', f'Token {token}'.encode()),
+                        (b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode()),
+                    ],
+                    'client': ('127.0.0.1', 0),
+                    'server': ('localhost', 80),
+                }, receive, send)
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(
+            client(requests[index % len(requests)])
+            for index in range(options['clients'])
+        ))
+        return statuses, latencies
+
+    def handle(self, *args, **options):
+        mode = options['mode']
+        if (mode == 'asgi') != settings.ASYNC_VIEWS:
+            raise CommandError(
+                f'Для режима {mode} запустите команду с ASYNC_VIEWS='
+                f'{mode == "asgi"}')
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f'Пользователь {options["user"]} не найден')
+        scenarios = (
+            MIXED if options['scenario'] == 'mixed'
+            else (options['scenario'],)
+        )
+        recipe = Recipe.objects.filter(author=user).order_by('id').first()
+        if recipe is None and 'upload' in scenarios:
+            raise CommandError(f'У пользователя {user} нет рецептов')
+        requests = [
+            self.get_request(scenario, user, recipe, options)
+            for scenario in scenarios
+        ]
+
+        started = time.perf_counter()
+        if mode == 'asgi':
+            statuses, latencies = asyncio.run(self.run_asgi(requests, options))
+        else:
+            statuses, latencies = self.run_wsgi(requests, options)
+        elapsed = time.perf_counter() - started
+
+        errors = sum(status >= 400 for status in statuses)
+        concurrency = (
+            f'потоков {settings.ASYNC_VIEW_WORKERS}' if mode == 'asgi'
+            else f'воркеров {options["workers"]}'
+        )
+        self.stdout.write(
+            f'{mode} {options["scenario"]}: клиентов {options["clients"]}, '
+            f'{concurrency}, тело запроса до '
+            f'{max(len(request[3]) for request in requests)} байт, '
+            f'скорость клиента {options["rate"]} байт/с'
+        )
+        self.stdout.write(
+            f'запросов {len(latencies)} за {elapsed:.2f} с: '
+            f'{len(latencies) / elapsed:.1f} запросов/с, '
+            f'p50 {percentile(latencies, 0.5) * 1000:.0f} мс, '
+            f'p95 {percentile(latencies, 0.95) * 1000:.0f} мс, '
+            f'ошибок {errors}'
+        )
+        if errors:
+            raise CommandError(f'Ответов с ошибкой: {errors}')
@@ -0,0 +1,98 @@
+import time
+from io import BytesIO
+
+from api.compression import brotli, compress
+from api.fast_serializers import FastRecipeListSerializer
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+from django.core.management.base import BaseCommand, CommandError
+from recipe.models import Recipe
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+
+def measure(function, iterations):
+    """Среднее время вызова function в миллисекундах и его результат."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = function()
+    return (time.perf_counter() - started) / iterations * 1000, result
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает JSONRenderer/JSONParser DRF с FastJSONRenderer/'
+            'FastJSONParser и сжатие ответа на страницах ленты рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', default='fake0',
+            help='Никнейм пользователя, чья лента используется.',
+        )
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=(6, 50, 200),
+            help='Размеры страниц ленты.',
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=100,
+            help='Сколько раз повторять каждую операцию.',
+        )
+
+    def get_page(self, user, size):
+        """Данные страницы ленты в том виде, в каком их отдает API."""
+        request = Request(APIRequestFactory().get('/api/recipes/feed/'))
+        request.user = user
+        recipes = Recipe.objects.from_followed(user).with_related(
+            user).order_by('-pub_date', '-id')[:size]
+        return {
+            'next': 'http://testserver/api/recipes/feed/?cursor=x',
+            'results': FastRecipeListSerializer(
+                recipes, many=True, context={'request': request}).data,
+        }
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f'Пользователь {options["user"]} не найден')
+
+        iterations = options['iterations']
+        self.stdout.write(
+            f'{"Рецептов":>8} {"Байт":>8} {"dumps DRF/fast, мс":>20} '
+            f'{"loads DRF/fast, мс":>20} {"gzip: байт, мс":>16} '
+            f'{"br: байт, мс":>16}'
+        )
+        for size in options['sizes']:
+            data = self.get_page(user, size)
+            render, content = measure(
+                lambda: JSONRenderer().render(data), iterations)
+            fast_render, fast_content = measure(
+                lambda: FastJSONRenderer().render(data), iterations)
+            if content != fast_content:
+                raise CommandError(
+                    f'{size}: FastJSONRenderer отдал другой JSON')
+
+            parse, parsed = measure(
+                lambda: JSONParser().parse(BytesIO(content)), iterations)
+            fast_parse, fast_parsed = measure(
+                lambda: FastJSONParser().parse(BytesIO(content)), iterations)
+            if parsed != fast_parsed:
+                raise CommandError(
+                    f'{size}: FastJSONParser разобрал JSON иначе')
+
+            compressed = []
+            for encoding in ('gzip', 'br'):
+                if encoding == 'br' and brotli is None:
+                    compressed.append('нет модуля')
+                    continue
+                elapsed, result = measure(
+                    lambda: compress(content, encoding), iterations)
+                compressed.append(f'{len(result)}, {elapsed:.2f}')
+
+            self.stdout.write(
+                f'{len(data["results"]):>8} {len(content):>8} '
+                f'{f"{render:.2f} / {fast_render:.2f}":>20} '
+                f'{f"{parse:.2f} / {fast_parse:.2f}":>20} '
+                f'{compressed[0]:>16} {compressed[1]:>16}'
+            )
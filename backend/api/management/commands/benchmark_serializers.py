@@ -0,0 +1,117 @@
+import time
+
+from api.fast_serializers import (FastRecipeListSerializer,
+                                  FastSubscribeSerializer)
+from api.serializers import RecipeListSerializer
+from api.utils import get_recipes_by_author
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from recipe.models import Recipe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import Subscribe, User
+from users.serializers import SubscribeSerializer
+
+
+class Command(BaseCommand):
+    help = ('Сверяет JSON быстрых сериализаторов (api.fast_serializers) '
+            'с обычными байт в байт и сравнивает время CPU на страницу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', default='fake0',
+            help='Никнейм пользователя для флагов и подписок.',
+        )
+        parser.add_argument(
+            '--page-size', type=int, default=6,
+            help='Размер страницы для замера времени.',
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=200,
+            help='Сколько раз сериализовать страницу.',
+        )
+        parser.add_argument(
+            '--parity-limit', type=int, default=1000,
+            help='Сколько объектов сверить с обычным сериализатором.',
+        )
+
+    @staticmethod
+    def get_request(user):
+        request = Request(APIRequestFactory().get('/api/'))
+        request.user = user
+        return request
+
+    def get_cases(self, user, limit):
+        """(название, обычный, быстрый, объекты, context) для сверки."""
+        for case_user in (AnonymousUser(), user):
+            recipes = list(Recipe.objects.with_related(case_user).order_by(
+                '-pub_date', '-id')[:limit])
+            yield (
+                f'recipes ({case_user})',
+                RecipeListSerializer, FastRecipeListSerializer,
+                recipes, {'request': self.get_request(case_user)},
+            )
+
+        subscribes = list(Subscribe.objects.filter(
+            user=user).select_related('author')[:limit])
+        for recipes_limit in (None, 3):
+            yield (
+                f'subscriptions (recipes_limit={recipes_limit})',
+                SubscribeSerializer, FastSubscribeSerializer, subscribes,
+                {
+                    'request': self.get_request(user),
+                    'recipes_by_author': get_recipes_by_author(
+                        [subscribe.author_id for subscribe in subscribes],
+                        limit=recipes_limit
+                    ),
+                },
+            )
+
+    def check_parity(self, name, serializer, fast_serializer, objs, context):
+        renderer = JSONRenderer()
+        expected = serializer(objs, many=True, context=context).data
+        actual = fast_serializer(objs, many=True, context=context).data
+        for index, (one, other) in enumerate(zip(expected, actual)):
+            if renderer.render(one) != renderer.render(other):
+                raise CommandError(
+                    f'{name}: объект {index} отличается\n'
+                    f'{renderer.render(one).decode()}\n'
+                    f'{renderer.render(other).decode()}'
+                )
+        if renderer.render(expected) != renderer.render(actual):
+            raise CommandError(f'{name}: JSON страницы отличается')
+
+    @staticmethod
+    def measure(serializer, objs, context, iterations):
+        started = time.process_time()
+        for _ in range(iterations):
+            serializer(objs, many=True, context=context).data
+        return (time.process_time() - started) / iterations * 1000
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f'Пользователь {options["user"]} не найден')
+
+        page_size = options['page_size']
+        self.stdout.write(
+            f'{"Страница":<36} {"DRF, мс":>8} {"Быстрый, мс":>12} '
+            f'{"Быстрее":>8}'
+        )
+        for name, serializer, fast_serializer, objs, context in (
+            self.get_cases(user, options['parity_limit'])
+        ):
+            self.check_parity(name, serializer, fast_serializer, objs, context)
+            page = objs[:page_size]
+            drf = self.measure(
+                serializer, page, context, options['iterations'])
+            fast = self.measure(
+                fast_serializer, page, context, options['iterations'])
+            self.stdout.write(
+                f'{name:<36} {drf:>8.3f} {fast:>12.3f} '
+                f'{drf / max(fast, 1e-9):>7.1f}x'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'JSON совпадает (до {options["parity_limit"]} объектов '
+            f'в каждом случае)'))
@@ -0,0 +1,349 @@
+import os
+import random
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from itertools import accumulate, islice
+
+from api.cache import reference_cache
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+from recipe.models import (Component, Favorite, Ingredient, Recipe, RecipeTag,
+                           ShoppingCart, Tag)
+from users.models import Subscribe, User
+
+DEFAULT_INGREDIENTS = os.path.join(
+    settings.BASE_DIR.parent, 'data', 'ingredients.csv'
+)
+# Общая картинка всех сгенерированных рецептов, в каталоге upload_to поля
+# Recipe.image: иначе выгрузка не проходит обратно через import_recipes
+IMAGE_NAME = 'media/fake.png'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = ('Создает синтетический набор данных для нагрузочных тестов: '
+            'пользователей, рецепты, избранное, списки покупок и подписки. '
+            'С одинаковыми параметрами и --seed набор воспроизводим.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей.',
+        )
+        parser.add_argument(
+            '--authors', type=float, default=0.2,
+            help='Доля пользователей, у которых есть рецепты.',
+        )
+        parser.add_argument(
+            '--recipes-per-author', type=int, default=10,
+            help='Количество рецептов у каждого автора.',
+        )
+        parser.add_argument(
+            '--components', type=int, nargs=2, default=(3, 12),
+            metavar=('MIN', 'MAX'),
+            help='Сколько ингредиентов в рецепте (от и до).',
+        )
+        parser.add_argument(
+            '--tags-per-recipe', type=int, default=2,
+            help='Максимум тегов у рецепта.',
+        )
+        parser.add_argument(
+            '--favorites-per-user', type=int, default=20,
+            help='Среднее число рецептов в избранном пользователя.',
+        )
+        parser.add_argument(
+            '--favorites-skew', type=float, default=0,
+            help='Показатель закона Ципфа при выборе рецептов в избранное: '
+                 '0 - равномерно, около 1 - большая часть добавлений '
+                 'приходится на немногие рецепты, а у остальных рейтинги '
+                 'малы и часто совпадают.',
+        )
+        parser.add_argument(
+            '--cart-per-user', type=int, default=5,
+            help='Среднее число рецептов в списке покупок пользователя.',
+        )
+        parser.add_argument(
+            '--subscriptions-per-user', type=int, default=10,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=90,
+            help='За сколько дней распределить даты публикации и добавлений.',
+        )
+        parser.add_argument(
+            '--ingredients', default=DEFAULT_INGREDIENTS,
+            help='Файл ингредиентов для load_ingredients, если он есть.',
+        )
+        parser.add_argument(
+            '--prefix', default='fake',
+            help='Префикс никнеймов и почт сгенерированных пользователей.',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора случайных чисел.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для bulk_create.',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее сгенерированных пользователей с --prefix.',
+        )
+
+    def bulk_insert(self, model, objs):
+        """bulk_create пачками, чтобы не держать все объекты в памяти."""
+        total = 0
+        for chunk in chunks(objs, self.batch_size):
+            model.objects.bulk_create(chunk)
+            total += len(chunk)
+        return total
+
+    def random_count(self, average, limit):
+        return min(self.rng.randint(0, 2 * average), limit)
+
+    def random_date(self):
+        return self.now - timedelta(
+            seconds=self.rng.randint(0, self.days * 24 * 60 * 60)
+        )
+
+    def report(self, message, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{message} за {elapsed:.1f} с')
+
+    def get_ingredients(self, path):
+        if os.path.exists(path):
+            call_command('load_ingredients', path, stdout=self.stdout)
+        ingredients = list(
+            Ingredient.objects.order_by('id').values_list('id', 'name')
+        )
+        if not ingredients:
+            raise CommandError(
+                f'Нет ингредиентов: загрузите их (load_ingredients) '
+                f'или укажите --ingredients (файл {path} не найден)'
+            )
+        return ingredients
+
+    def get_tags(self):
+        Tag.objects.bulk_create(
+            [Tag(name=name, color=color, slug=slug)
+             for name, color, slug in TAGS],
+            ignore_conflicts=True,
+        )
+        reference_cache.invalidate(Tag)
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def save_image(self):
+        if not default_storage.exists(IMAGE_NAME):
+            content = BytesIO()
+            Image.new('RGB', (64, 64), '#E26C2D').save(content, 'PNG')
+            default_storage.save(IMAGE_NAME, ContentFile(content.getvalue()))
+
+    def create_users(self, count, prefix):
+        # Хэш пароля считается долго, у всех пользователей он общий
+        password = make_password(prefix)
+        self.bulk_insert(User, (
+            User(
+                username=f'{prefix}{index}',
+                email=f'{prefix}{index}@example.com',
+                first_name='Имя',
+                last_name=f'Фамилия{index}',
+                password=password,
+            )
+            for index in range(count)
+        ))
+        return list(User.objects.filter(
+            username__startswith=prefix
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipes(self, author_ids, per_author, ingredients):
+        def recipes():
+            for author_id in author_ids:
+                for _ in range(per_author):
+                    first, second = self.rng.sample(ingredients, 2)
+                    yield Recipe(
+                        author_id=author_id,
+                        name=f'{first[1].capitalize()} и {second[1]}'[:200],
+                        image=IMAGE_NAME,
+                        text=f'Приготовьте {first[1]}, добавьте {second[1]}.',
+                        cooking_time=self.rng.randint(5, 180),
+                    )
+
+        self.bulk_insert(Recipe, recipes())
+        recipe_ids = list(Recipe.objects.filter(
+            author_id__in=author_ids
+        ).order_by('id').values_list('id', flat=True))
+        # auto_now_add не дает задать дату в bulk_create, а bulk_update
+        # pre_save не вызывает
+        for chunk in chunks(recipe_ids, self.batch_size):
+            dates = sorted(self.random_date() for _ in chunk)
+            Recipe.objects.bulk_update(
+                [Recipe(id=recipe_id, pub_date=date, updated_at=date)
+                 for recipe_id, date in zip(chunk, dates)],
+                ['pub_date', 'updated_at'],
+            )
+        return recipe_ids
+
+    def create_recipe_relations(self, recipe_ids, ingredient_ids, tag_ids,
+                                components, tags_per_recipe):
+        low, high = components
+        high = min(high, len(ingredient_ids))
+        self.bulk_insert(Component, (
+            Component(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.rng.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.rng.sample(
+                ingredient_ids, self.rng.randint(min(low, high), high)
+            )
+        ))
+        self.bulk_insert(RecipeTag, (
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.rng.sample(tag_ids, self.rng.randint(
+                1, min(tags_per_recipe, len(tag_ids))
+            ))
+        ))
+
+    def get_skewed_choice(self, recipe_ids, skew):
+        """
+        Функция выбора count разных рецептов, где рецепт с рангом k
+        выбирается с весом 1 / k ** skew. Ранги раздаются случайно.
+        """
+        if not skew:
+            return lambda count: self.rng.sample(recipe_ids, count)
+        ranked = self.rng.sample(recipe_ids, len(recipe_ids))
+        cum_weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(ranked) + 1)
+        ))
+
+        def choose(count):
+            chosen = {}
+            while len(chosen) < count:
+                chosen.update(dict.fromkeys(self.rng.choices(
+                    ranked, cum_weights=cum_weights, k=count - len(chosen)
+                )))
+            return list(chosen)
+
+        return choose
+
+    def create_user_relations(self, user_ids, author_ids, recipe_ids,
+                              options):
+        def user_recipes(model, average, choose):
+            for user_id in user_ids:
+                count = self.random_count(average, len(recipe_ids))
+                for recipe_id in choose(count):
+                    yield model(
+                        user_id=user_id,
+                        recipe_id=recipe_id,
+                        created=self.random_date(),
+                    )
+
+        def subscriptions():
+            for user_id in user_ids:
+                count = self.random_count(
+                    options['subscriptions_per_user'], len(author_ids)
+                )
+                for author_id in self.rng.sample(author_ids, count):
+                    if author_id != user_id:
+                        yield Subscribe(user_id=user_id, author_id=author_id)
+
+        return {
+            'favorites': self.bulk_insert(Favorite, user_recipes(
+                Favorite, options['favorites_per_user'],
+                self.get_skewed_choice(recipe_ids, options['favorites_skew'])
+            )),
+            'shopping_cart': self.bulk_insert(ShoppingCart, user_recipes(
+                ShoppingCart, options['cart_per_user'],
+                self.get_skewed_choice(recipe_ids, 0)
+            )),
+            'subscriptions': self.bulk_insert(Subscribe, subscriptions()),
+        }
+
+    def rebuild_derived_data(self):
+        """Счетчики, итоги корзин и рейтинги: bulk_create не шлет сигналы."""
+        # Расхождения по каждой новой строке ожидаемы, их не выводим
+        for command in ('rebuild_counters', 'rebuild_cart_totals',
+                        'refresh_recipe_scores'):
+            call_command(command, stdout=self.stdout, stderr=StringIO())
+        if settings.FULL_TEXT_SEARCH:
+            call_command('rebuild_search_vectors', stdout=self.stdout)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.days = options['days']
+        self.now = timezone.now()
+        prefix = options['prefix']
+
+        existing = User.objects.filter(username__startswith=prefix)
+        if options['clear']:
+            started = time.perf_counter()
+            existing.delete()
+            self.report('Старые данные удалены', started)
+        elif existing.exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                f'используйте --clear или другой --prefix'
+            )
+
+        ingredients = self.get_ingredients(options['ingredients'])
+        tag_ids = self.get_tags()
+        self.save_image()
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'], prefix)
+            author_ids = self.rng.sample(
+                user_ids, max(1, int(len(user_ids) * options['authors']))
+            )
+            recipe_ids = self.create_recipes(
+                author_ids, options['recipes_per_author'], ingredients
+            )
+            self.create_recipe_relations(
+                recipe_ids,
+                [ingredient_id for ingredient_id, _ in ingredients],
+                tag_ids,
+                options['components'],
+                options['tags_per_recipe'],
+            )
+            relations = self.create_user_relations(
+                user_ids, author_ids, recipe_ids, options
+            )
+        self.report(
+            f'Создано пользователей: {len(user_ids)}, авторов: '
+            f'{len(author_ids)}, рецептов: {len(recipe_ids)}, '
+            f'в избранном: {relations["favorites"]}, в списках покупок: '
+            f'{relations["shopping_cart"]}, подписок: '
+            f'{relations["subscriptions"]}',
+            started
+        )
+
+        started = time.perf_counter()
+        self.rebuild_derived_data()
+        self.report('Производные данные пересчитаны', started)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, пароль пользователей: {prefix}'))
@@ -0,0 +1,56 @@
+import sys
+import time
+
+from api.bulk import RecipeImporter
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Импортирует рецепты из NDJSON-файла (по рецепту в строке). '
+            'Картинка - base64 или имя картинки рецепта в хранилище, '
+            'например из выгрузки /api/recipes/export/.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Путь к файлу или «-» для чтения из stdin.',
+        )
+        parser.add_argument(
+            '--author',
+            required=True,
+            help='Никнейм или почта автора импортируемых рецептов.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество рецептов в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        author = User.objects.filter(
+            Q(username=options['author']) | Q(email=options['author'])
+        ).first()
+        if author is None:
+            raise CommandError(f'Автор {options["author"]} не найден')
+
+        importer = RecipeImporter(
+            author=author, batch_size=options['batch_size'],
+            allow_image_names=True,
+        )
+        started = time.perf_counter()
+        if options['path'] == '-':
+            report = importer.run(sys.stdin)
+        else:
+            with open(options['path'], encoding='utf-8') as file:
+                report = importer.run(file)
+        elapsed = time.perf_counter() - started
+
+        for error in report['errors']:
+            self.stderr.write(f'Строка {error["line"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано рецептов: {report["created"]}, '
+            f'ошибок: {len(report["errors"])}, за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,90 @@
+import csv
+import json
+import os
+import time
+
+from api.cache import reference_cache
+from django.core.management.base import BaseCommand, CommandError
+from recipe.models import Ingredient
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    """
+    Список {"name", "measurement_unit"} или фикстура Django
+    ({"model", "pk", "fields"}), как в dump.json.
+    """
+    with open(path, encoding='utf-8') as file:
+        rows = json.load(file)
+    for row in rows:
+        if 'fields' in row:
+            if row.get('model') != 'recipe.ingredient':
+                continue
+            row = row['fields']
+        yield row['name'], row['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV или JSON пачками. '
+            'Повторный запуск не создает дубликатов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='Файлы .csv (name,measurement_unit) или .json.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create.',
+        )
+
+    def read_rows(self, paths):
+        for path in paths:
+            reader = READERS.get(os.path.splitext(path)[1].lower())
+            if reader is None:
+                raise CommandError(f'Неизвестный формат файла: {path}')
+            for name, measurement_unit in reader(path):
+                yield name.strip(), measurement_unit.strip()
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        seen = set(Ingredient.objects.values_list('name', 'measurement_unit'))
+        total = 0
+        new = []
+        for key in self.read_rows(options['paths']):
+            total += 1
+            if key in seen:
+                continue
+            seen.add(key)
+            new.append(Ingredient(name=key[0], measurement_unit=key[1]))
+
+        if new:
+            # ignore_conflicts защищает от параллельной загрузки тех же строк
+            Ingredient.objects.bulk_create(
+                new,
+                batch_size=options['batch_size'],
+                ignore_conflicts=True,
+            )
+            # bulk_create не шлет post_save, сбрасываем кэш справочника
+            reference_cache.invalidate(Ingredient)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {total}, добавлено: {len(new)}, '
+            f'за {elapsed:.2f} с ({total / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+# Метрики текущего запроса, заполняются metrics_middleware
+current_metrics = ContextVar('current_metrics', default=None)
+
+QUANTILES = (0.5, 0.9, 0.99)
+# Сколько последних SQL хранить на запрос для лога превышения бюджета
+QUERY_SAMPLE_SIZE = 100
+
+
+def get_fingerprint(sql):
+    """SQL без различий в пробелах и длине списков IN (%s, ...)."""
+    sql = re.sub(r'\s+', ' ', sql).strip()
+    return re.sub(r'IN \((?:%s, )*%s\)', 'IN (...)', sql)
+
+
+class RequestMetrics:
+    """
+    Число и время запросов к БД и время этапов одного HTTP-запроса.
+    Текст хранится только у последних QUERY_SAMPLE_SIZE запросов,
+    чтобы выгрузки с тысячами запросов не держали весь SQL в памяти.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.queries = deque(maxlen=QUERY_SAMPLE_SIZE)
+        self.db_time = 0.0
+        self.timings = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обертка выполнения запроса, см. record_query
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.query_count += 1
+            self.queries.append(sql)
+
+    def get_total(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        parts = [
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.query_count} queries"'
+        ]
+        parts.extend(
+            f'{name};dur={value * 1000:.1f}'
+            for name, value in self.timings.items()
+        )
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка выполнения запросов, которую api.signals ставит на каждое
+    подключение к БД. Запрос попадает в метрики текущего HTTP-запроса
+    из contextvar, поэтому учитываются и запросы из потоков пула
+    асинхронных view (api.async_views).
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+@contextmanager
+def timer(name):
+    """Добавляет время блока к этапу name текущего запроса."""
+    metrics = current_metrics.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.timings[name] += time.perf_counter() - started
+
+
+class MetricsRegistry:
+    """
+    Метрики по методу и маршруту в памяти процесса: счетчики и суммы
+    с запуска и последние METRICS_SAMPLE_SIZE замеров для квантилей.
+    У каждого воркера gunicorn свой реестр.
+    """
+    series = (
+        ('request_duration_seconds', 'Время обработки запроса'),
+        ('db_duration_seconds', 'Время запросов к БД'),
+        ('serializer_duration_seconds', 'Время сериализации'),
+        ('db_queries', 'Число запросов к БД'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.counts = Counter()
+        self.sums = defaultdict(Counter)
+        self.budget_exceeded = Counter()
+
+    def record(self, route, sample):
+        with self._lock:
+            samples = self.samples.get(route)
+            if samples is None:
+                samples = self.samples[route] = deque(
+                    maxlen=settings.METRICS_SAMPLE_SIZE
+                )
+            samples.append(sample)
+            self.counts[route] += 1
+            self.sums[route].update(sample)
+
+    def record_budget_exceeded(self, route):
+        with self._lock:
+            self.budget_exceeded[route] += 1
+
+    @staticmethod
+    def quantile(values, q):
+        values = sorted(values)
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        with self._lock:
+            samples = {
+                route: list(values) for route, values in self.samples.items()
+            }
+            counts = dict(self.counts)
+            sums = {route: dict(value) for route, value in self.sums.items()}
+            budget_exceeded = dict(self.budget_exceeded)
+
+        lines = []
+        for name, description in self.series:
+            metric = f'foodgram_{name}'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} summary')
+            for route in sorted(samples):
+                labels = 'method="{}",route="{}"'.format(*route)
+                values = [sample[name] for sample in samples[route]]
+                for q in QUANTILES:
+                    lines.append(
+                        f'{metric}{{{labels},quantile="{q}"}} '
+                        f'{self.quantile(values, q):g}'
+                    )
+                lines.append(
+                    f'{metric}_sum{{{labels}}} {sums[route].get(name, 0):g}'
+                )
+                lines.append(f'{metric}_count{{{labels}}} {counts[route]}')
+
+        metric = 'foodgram_budget_exceeded_total'
+        lines.append(f'# HELP {metric} Запросы, превысившие бюджет маршрута')
+        lines.append(f'# TYPE {metric} counter')
+        for route in sorted(budget_exceeded):
+            labels = 'method="{}",route="{}"'.format(*route)
+            lines.append(f'{metric}{{{labels}}} {budget_exceeded[route]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class TimedSerializer:
+    """
+    Обертка сериализатора из MetricsMixin.get_serializer: время
+    получения .data идет в этап serializer текущего запроса.
+    """
+    def __init__(self, serializer):
+        self._serializer = serializer
+
+    def __getattr__(self, name):
+        return getattr(self._serializer, name)
+
+    @property
+    def data(self):
+        with timer('serializer'):
+            return self._serializer.data
+
+
+def check_budget(route, metrics, total):
+    """
+    Пишет предупреждение, если запрос превысил бюджет маршрута из
+    METRICS_BUDGETS ({'GET recipes-list': {'queries': 10, 'time': 0.2}}),
+    с самыми частыми из последних QUERY_SAMPLE_SIZE запросов к БД.
+    route - пара (метод, имя маршрута).
+    """
+    budget = settings.METRICS_BUDGETS.get(' '.join(route))
+    if not budget:
+        return
+    exceeded = (
+        metrics.query_count > budget.get('queries', float('inf'))
+        or total > budget.get('time', float('inf'))
+    )
+    if not exceeded:
+        return
+    registry.record_budget_exceeded(route)
+    fingerprints = Counter(map(get_fingerprint, metrics.queries))
+    logger.warning(
+        'Маршрут %s превысил бюджет %s: %d запросов к БД, %.1f мс. '
+        'Частые запросы:\n%s',
+        ' '.join(route), budget, metrics.query_count, total * 1000,
+        '\n'.join(
+            f'{count} x {fingerprint}'
+            for fingerprint, count in fingerprints.most_common(5)
+        )
+    )
+
+
+def get_route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return request.method, 'unmatched'
+    return request.method, match.url_name or match.view_name
+
+
+def finish_request(request, response, metrics):
+    """Записывает метрики запроса в реестр и проверяет бюджет маршрута."""
+    total = metrics.get_total()
+    route = get_route(request)
+    registry.record(route, {
+        'request_duration_seconds': total,
+        'db_duration_seconds': metrics.db_time,
+        'serializer_duration_seconds': metrics.timings.get(
+            'serializer', 0.0),
+        'db_queries': metrics.query_count,
+    })
+    check_budget(route, metrics, total)
+    if settings.METRICS_SERVER_TIMING:
+        response['Server-Timing'] = metrics.server_timing(total)
+    return response
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Считает запросы к БД и время обработки каждого HTTP-запроса,
+    группирует по имени маршрута (recipes-list, users-subscriptions),
+    добавляет заголовок Server-Timing и проверяет бюджеты маршрутов.
+    Для потоковых ответов учитывается только время до начала отдачи.
+    Под ASGI возвращает корутину и работает без перехода в поток.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics = RequestMetrics()
+            token = current_metrics.set(metrics)
+            try:
+                response = await get_response(request)
+            finally:
+                current_metrics.reset(token)
+            return finish_request(request, response, metrics)
+    else:
+        def middleware(request):
+            metrics = RequestMetrics()
+            token = current_metrics.set(metrics)
+            try:
+                response = get_response(request)
+            finally:
+                current_metrics.reset(token)
+            return finish_request(request, response, metrics)
+    return middleware
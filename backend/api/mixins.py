@@ -0,0 +1,122 @@
+import hashlib
+
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from recipe.models import Ingredient, Recipe, Tag
+from rest_framework.response import Response
+
+from .cache import reference_cache
+from .metrics import TimedSerializer
+
+
+class MetricsMixin:
+    """Время сериализации ответа попадает в метрики запроса."""
+    def get_serializer(self, *args, **kwargs):
+        return TimedSerializer(super().get_serializer(*args, **kwargs))
+
+
+class CachedReferenceMixin:
+    """
+    list/retrieve для справочников из api.cache с ETag по версии данных:
+    при совпадении If-None-Match отдается 304 без сериализации.
+    """
+    reference_getter = None
+
+    def get_reference(self):
+        return self.reference_getter()
+
+    def filter_reference(self, objects):
+        return objects
+
+    def reference_response(self, version, data_getter):
+        etag = f'"{version}"'
+        not_modified = get_conditional_response(self.request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        return Response(data_getter(), headers={'ETag': etag})
+
+    def list(self, request, *args, **kwargs):
+        version, objects = self.get_reference()
+        return self.reference_response(
+            version,
+            lambda: self.get_serializer(
+                self.filter_reference(objects), many=True
+            ).data
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        version, objects = self.get_reference()
+        pk = str(kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        for obj in objects:
+            if str(obj.pk) == pk:
+                return self.reference_response(
+                    version, lambda: self.get_serializer(obj).data
+                )
+        raise Http404
+
+
+class ConditionalRecipeMixin:
+    """
+    ETag и Last-Modified для списка и страницы рецепта.
+    Валидатор считается по легкой выборке (Recipe.validator_values):
+    updated_at, флаги пользователя и поля автора, плюс версии справочников
+    тегов и ингредиентов. При совпадении If-None-Match отдается 304 без
+    полной выборки и сериализации. If-Modified-Since не используется:
+    дата изменения не учитывает избранное, корзину и подписки.
+    """
+    def get_validator_queryset(self):
+        return Recipe.objects.annotate_user_flags(self.request.user)
+
+    def get_etag(self, rows, *extra):
+        versions = (
+            reference_cache.get_version(Tag),
+            reference_cache.get_version(Ingredient),
+        )
+        digest = hashlib.md5(
+            repr((rows, versions, extra)).encode()
+        ).hexdigest()
+        return f'"{digest}"'
+
+    def finalize_conditional(self, response, etag, rows):
+        response['ETag'] = etag
+        if rows:
+            last_modified = max(row['updated_at'] for row in rows)
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Ответ зависит от пользователя
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        validators = self.filter_queryset(
+            self.get_validator_queryset()
+        ).validator_values(request.user)
+        rows = self.paginate_queryset(validators)
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+        rows = list(rows)
+        etag = self.get_etag(rows, self.paginator.get_validator())
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return self.finalize_conditional(not_modified, etag, rows)
+
+        recipes = self.get_queryset().in_bulk([row['id'] for row in rows])
+        serializer = self.get_serializer(
+            [recipes[row['id']] for row in rows if row['id'] in recipes],
+            many=True
+        )
+        response = self.get_paginated_response(serializer.data)
+        return self.finalize_conditional(response, etag, rows)
+
+    def retrieve(self, request, *args, **kwargs):
+        row = get_object_or_404(
+            self.get_validator_queryset().validator_values(request.user),
+            pk=kwargs.get('pk')
+        )
+        etag = self.get_etag([row])
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return self.finalize_conditional(not_modified, etag, [row])
+        response = super().retrieve(request, *args, **kwargs)
+        return self.finalize_conditional(response, etag, [row])
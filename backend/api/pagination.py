@@ -1,6 +1,286 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация по (-pub_date, -id) или по порядку, заданному
+    фильтром ordering: без COUNT и OFFSET, следующая страница выбирается
+    по индексу от последней позиции. В отличие от CursorPagination курсор
+    хранит значения всех полей порядка, а порядок всегда заканчивается
+    уникальным id. Поэтому совпадающие значения первого поля (нулевые
+    рейтинги) не приводят к курсорам со смещением o= и OFFSET.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+    unique_orderings = ('id', '-id', 'pk', '-pk')
+    position_separator = ','
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(queryset.query.order_by) or self.ordering
+        if ordering[-1] not in self.unique_orderings:
+            ordering += ('-id',)
+        return ordering
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(instance[field_name])
+            else:
+                values.append(getattr(instance, field_name))
+        return self.position_separator.join(str(value) for value in values)
+
+    def get_keyset_filter(self, ordering, position):
+        """
+        Условие «после position» для порядка ordering:
+        a <= x AND ((a < x) OR (a = x AND b < y) OR ...) для полей по
+        убыванию. Без первой части SQLite просматривает индекс с начала.
+        """
+        values = position.split(self.position_separator)
+        if len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = {}
+        for order, value in zip(ordering, values):
+            field_name = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            if not equal:
+                bound = Q(**{f'{field_name}__{lookup}e': value})
+            condition |= Q(**equal, **{f'{field_name}__{lookup}': value})
+            equal[field_name] = value
+        return bound & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                order[1:] if order.startswith('-') else f'-{order}'
+                for order in ordering
+            )
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(ordering, position)
+                )
+            except (DjangoValidationError, ValueError):
+                raise NotFound(self.invalid_cursor_message) from None
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > self.page_size:
+            following = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        has_position = position is not None or offset > 0
+        if reverse:
+            # Страница выбрана в обратном порядке, вперед ведет курсор
+            self.page.reverse()
+            self.has_next = has_position
+            self.has_previous = following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next = following is not None
+            self.has_previous = has_position
+            self.next_position, self.previous_position = following, position
+        self.display_page_controls = self.has_previous or self.has_next
+        return self.page
+
+    def get_cursor(self, instance, ordering=None):
+        """Значение ?cursor= для страницы, следующей за instance."""
+        ordering = ordering or self.ordering
+        if ordering[-1] not in self.unique_orderings:
+            ordering += ('-id',)
+        position = self._get_position_from_instance(instance, ordering)
+        querystring = urlencode({'p': position})
+        return b64encode(querystring.encode('ascii')).decode('ascii')
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class RecipePagination(CustomPagination):
+    """
+    Постраничная пагинация page/limit, а при наличии параметра cursor
+    (в том числе пустого для первой страницы) - курсорная.
+    """
+    cursor_query_param = 'cursor'
+
+    def __init__(self):
+        self.cursor_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_pagination = RecipeCursorPagination()
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_validator(self):
+        """Состояние пагинации, влияющее на ответ (для ETag)."""
+        if self.cursor_pagination is not None:
+            return (self.cursor_pagination.get_next_link(),
+                    self.cursor_pagination.get_previous_link())
+        return self.page.paginator.count
+
+
+class FeedPagination(BasePagination):
+    """
+    Keyset-пагинация ленты по (-pub_date, -id): курсор хранит позицию
+    последнего рецепта страницы, следующая страница выбирается по индексу
+    без OFFSET. Если view отдает закэшированную ленту (get_timeline),
+    страница вырезается из нее и рецепты выбираются по id. Параметры,
+    меняющие порядок (ordering, search), отклоняются: на порядке
+    (-pub_date, -id) держатся и курсор, и кэш ленты.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+    ordering_query_params = ('ordering', 'search')
+    ordering_message = 'Лента упорядочена только по дате публикации.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, pk = b64decode(encoded.encode()).decode().split(',')
+            position = (parse_datetime(pub_date), int(pk))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message) from None
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    @staticmethod
+    def encode_cursor(position):
+        pub_date, pk = position
+        return b64encode(f'{pub_date.isoformat()},{pk}'.encode()).decode()
+
+    @staticmethod
+    def get_position(row):
+        if isinstance(row, dict):
+            return row['pub_date'], row['id']
+        return row.pub_date, row.id
+
+    def paginate_from_timeline(self, queryset, timeline, position):
+        """Страница из кэша или None, если она выходит за его пределы."""
+        start = 0
+        if position is not None:
+            start = next(
+                (index for index, entry in enumerate(timeline)
+                 if entry < position),
+                len(timeline)
+            )
+        entries = timeline[start:start + self.page_size + 1]
+        if (len(entries) <= self.page_size
+                and len(timeline) >= settings.FEED_CACHE_SIZE):
+            # Кэш обрезан, продолжение ленты есть только в БД
+            return None
+        page_entries = entries[:self.page_size]
+        rows = {
+            row['id'] if isinstance(row, dict) else row.id: row
+            for row in queryset.filter(
+                id__in=[pk for _, pk in page_entries]
+            )
+        }
+        self.set_next(page_entries, has_next=len(entries) > self.page_size)
+        # Удаленные после кэширования рецепты просто пропускаются
+        return [rows[pk] for _, pk in page_entries if pk in rows]
+
+    def paginate_from_database(self, queryset, position):
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+            )
+        rows = list(
+            queryset.order_by('-pub_date', '-id')[:self.page_size + 1]
+        )
+        page = rows[:self.page_size]
+        self.set_next(
+            [self.get_position(row) for row in page[-1:]],
+            has_next=len(rows) > self.page_size
+        )
+        return page
+
+    def set_next(self, page_entries, has_next):
+        self.next_position = page_entries[-1] if has_next else None
+
+    def check_ordering(self, request):
+        errors = {
+            param: [self.ordering_message]
+            for param in self.ordering_query_params
+            if request.query_params.get(param)
+        }
+        if errors:
+            raise ValidationError(errors)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.check_ordering(request)
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        get_timeline = getattr(view, 'get_timeline', None)
+        timeline = get_timeline() if get_timeline is not None else None
+        if timeline is not None:
+            page = self.paginate_from_timeline(queryset, timeline, position)
+            if page is not None:
+                return page
+        return self.paginate_from_database(queryset, position)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_validator(self):
+        return self.get_next_link()
@@ -0,0 +1,53 @@
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser на orjson, если он установлен. Тело, которое orjson
+    не разобрал, и тело не в UTF-8 разбирает JSONParser: сообщения
+    об ошибках остаются прежними. Целые больше 64 бит orjson читает
+    как float, для полей API это так же неверное значение.
+    """
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower() not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        data = stream.read()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return super().parse(BytesIO(data), media_type, parser_context)
+
+
+class NDJSONParser(BaseParser):
+    """
+    Тело с JSON-объектом в каждой строке. Возвращает генератор строк,
+    поток запроса читается по мере обработки. Вместо строки не в
+    кодировке запроса генератор отдает None: RecipeImporter записывает
+    ее в ошибки с номером строки и продолжает импорт.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if stream is None:
+            return iter(())
+        return self.decode_lines(stream, encoding)
+
+    @staticmethod
+    def decode_lines(stream, encoding):
+        for line in stream:
+            try:
+                yield line.decode(encoding)
+            except UnicodeDecodeError:
+                yield None
@@ -0,0 +1,151 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Даты отдаются кодировщику DRF: формат как у JSONRenderer (Z, мс)
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson, если он установлен. Типы, которых orjson не
+    знает (Decimal, ленивые строки переводов), и даты кодируются
+    encoder_class DRF, поэтому ответ совпадает с JSONRenderer. С отступом
+    (браузерный API), ensure_ascii, без orjson и при ошибке orjson
+    работает JSONRenderer.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        use_default = (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        )
+        if not use_default:
+            try:
+                ret = orjson.dumps(
+                    data,
+                    default=self.encoder_class().default,
+                    option=ORJSON_OPTIONS,
+                )
+            except orjson.JSONEncodeError:
+                # Целые больше 64 бит и типы, которых не знает и DRF
+                use_default = True
+        if use_default:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        # Как JSONRenderer: U+2028 и U+2029 экранируются для JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок. Строки отдаются генератором stream,
+    чтобы большой список не собирался в памяти целиком.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Ошибки (например, 401) приходят словарем, а не строками списка
+            return '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return ''.join(self.stream(data))
+
+    def stream(self, ingredients):
+        raise NotImplementedError('Метод stream() должен быть переопределен')
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield 'Ваш список покупок:\n'
+        for ingredient in ingredients:
+            yield (f"{ingredient['ingredient__name']} "
+                   f"({ingredient['ingredient__measurement_unit']}) "
+                   f"{ingredient['amount']}\n")
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку."""
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество')
+        )
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['amount'],
+            ))
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, ingredients):
+        yield '['
+        for index, ingredient in enumerate(ingredients):
+            row = json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['amount'],
+            }, ensure_ascii=False)
+            yield row if index == 0 else ',' + row
+        yield ']'
+
+
+# Первый рендерер используется по умолчанию (без ?format=)
+SHOPPING_LIST_RENDERERS = (
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    JSONShoppingListRenderer,
+)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Построчный JSON для выгрузки рецептов, отдается генератором stream."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = [data]
+        return ''.join(self.stream(data))
+
+    def stream(self, rows):
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Текстовый формат Prometheus для /api/_metrics."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return data
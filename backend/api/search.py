@@ -0,0 +1,407 @@
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db.models import Case, Count, F, FloatField, Max, Value, When
+from recipe.models import Component, Ingredient, Recipe
+
+from .cache import get_ingredients, reference_cache
+
+# Веса частей рецепта как у ts_rank по умолчанию для весов A, B, C
+SEARCH_WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+# Сколько лучших совпадений отдает поиск без PostgreSQL
+SEARCH_FALLBACK_LIMIT = 500
+
+
+def normalize(value):
+    """Приводит строку к виду для поиска: casefold и «ё» -> «е»."""
+    return value.casefold().replace('ё', 'е')
+
+
+def tokenize(value):
+    return re.findall(r'\w+', normalize(value))
+
+
+def find_prefix(keys, prefix):
+    """Границы ключей отсортированного списка, начинающихся с prefix."""
+    start = bisect_left(keys, prefix)
+    end = start
+    while end < len(keys) and keys[end].startswith(prefix):
+        end += 1
+    return start, end
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+    Имена хранятся отсортированными, поэтому совпадения по началу строки
+    находятся бинарным поиском, а затем добавляются совпадения по подстроке.
+    Индекс перестраивается при смене версии справочника в api.cache.
+    """
+    def __init__(self):
+        self._state = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build(version, ingredients):
+        entries = sorted(
+            (normalize(ingredient.name), ingredient.id, ingredient)
+            for ingredient in ingredients
+        )
+        keys = [key for key, _, _ in entries]
+        by_name = [ingredient for _, _, ingredient in entries]
+        return version, ingredients, keys, by_name
+
+    def get_state(self):
+        version, ingredients = get_ingredients()
+        state = self._state
+        if state is not None and state[0] == version:
+            return state
+        with self._lock:
+            # Состояние подменяется целиком, читатели видят старое или новое
+            if self._state is None or self._state[0] != version:
+                self._state = self.build(version, ingredients)
+            return self._state
+
+    def search(self, query):
+        """
+        Возвращает ингредиенты, начинающиеся с query, затем содержащие
+        query. Пустой запрос возвращает все ингредиенты по порядку id.
+        """
+        _, ingredients, keys, by_name = self.get_state()
+        needle = normalize(query)
+        if not needle:
+            return ingredients
+
+        start, end = find_prefix(keys, needle)
+        prefix_matches = by_name[start:end]
+        substring_matches = [
+            ingredient for key, ingredient in zip(keys, by_name)
+            if needle in key and not key.startswith(needle)
+        ]
+        return prefix_matches + substring_matches
+
+
+ingredient_index = IngredientIndex()
+
+
+class RecipeSearchIndex:
+    """
+    Инвертированный индекс рецептов в памяти процесса для СУБД без
+    полнотекстового поиска (SQLite в тестах). Слово -> {id: вес}, где
+    вес зависит от части рецепта (SEARCH_WEIGHTS). Слова запроса ищутся
+    по началу слова, рецепт должен содержать все слова запроса.
+    Как и RecipeIngredientIndex, индекс синхронизируется с БД не чаще
+    раза в refresh_interval секунд: измененные рецепты переиндексируются,
+    удаленные убираются, а полностью индекс перестраивается только при
+    смене версии справочника ингредиентов (переименование меняет слова
+    многих рецептов).
+    """
+    # Транзакция могла зафиксироваться позже, чем выставлен updated_at
+    overlap = timedelta(minutes=1)
+
+    def __init__(self, refresh_interval=5):
+        self.refresh_interval = refresh_interval
+        self.keys = []
+        self.postings = {}
+        self.tokens = {}
+        self.recipe_ids = set()
+        self.last_modified = None
+        self.ingredients_version = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_weights(recipe, ingredient_names):
+        weights = defaultdict(float)
+        for part in ('name', 'text'):
+            for token in tokenize(recipe[part]):
+                weights[token] += SEARCH_WEIGHTS[part]
+        for name in ingredient_names:
+            for token in tokenize(name):
+                weights[token] += SEARCH_WEIGHTS['ingredients']
+        return weights
+
+    def index_recipes(self, recipes):
+        """Строит веса слов рецептов values('id', 'name', 'text')."""
+        names = defaultdict(list)
+        components = Component.objects.filter(
+            recipe_id__in=[recipe['id'] for recipe in recipes]
+        ).values_list('recipe_id', 'ingredient__name')
+        for recipe_id, name in components:
+            names[recipe_id].append(name)
+        return {
+            recipe['id']: self.get_weights(recipe, names[recipe['id']])
+            for recipe in recipes
+        }
+
+    def rebuild(self):
+        postings = defaultdict(dict)
+        self.tokens = {}
+        recipes = Recipe.objects.values('id', 'name', 'text')
+        names = defaultdict(list)
+        for recipe_id, name in Component.objects.values_list(
+                'recipe_id', 'ingredient__name').iterator():
+            names[recipe_id].append(name)
+        for recipe in recipes.iterator():
+            weights = self.get_weights(recipe, names[recipe['id']])
+            for token, weight in weights.items():
+                postings[token][recipe['id']] = weight
+            self.tokens[recipe['id']] = tuple(weights)
+        self.postings = dict(postings)
+        self.keys = sorted(postings)
+        self.recipe_ids = set(self.tokens)
+
+    def remove_recipe(self, recipe_id):
+        for token in self.tokens.pop(recipe_id, ()):
+            recipe_weights = self.postings[token]
+            del recipe_weights[recipe_id]
+            if not recipe_weights:
+                del self.postings[token]
+                del self.keys[bisect_left(self.keys, token)]
+
+    def add_recipe(self, recipe_id, weights):
+        for token, weight in weights.items():
+            recipe_weights = self.postings.get(token)
+            if recipe_weights is None:
+                recipe_weights = self.postings[token] = {}
+                insort(self.keys, token)
+            recipe_weights[recipe_id] = weight
+        self.tokens[recipe_id] = tuple(weights)
+
+    def apply_changes(self, since):
+        """Переиндексирует рецепты, измененные начиная с since."""
+        recipes = list(Recipe.objects.filter(
+            updated_at__gte=since - self.overlap
+        ).values('id', 'name', 'text'))
+        for recipe_id, weights in self.index_recipes(recipes).items():
+            self.remove_recipe(recipe_id)
+            self.add_recipe(recipe_id, weights)
+            self.recipe_ids.add(recipe_id)
+
+    def apply_deletions(self):
+        """Убирает из индекса рецепты, которых больше нет в БД."""
+        recipe_ids = set(Recipe.objects.values_list('id', flat=True))
+        for recipe_id in self.recipe_ids - recipe_ids:
+            self.remove_recipe(recipe_id)
+        self.recipe_ids = recipe_ids
+
+    def refresh(self):
+        """Синхронизирует индекс с БД, вызывается под блокировкой."""
+        ingredients_version = reference_cache.get_version(Ingredient)
+        stats = Recipe.objects.aggregate(
+            count=Count('id'), last_modified=Max('updated_at')
+        )
+        if (self.last_modified is None
+                or ingredients_version != self.ingredients_version):
+            self.rebuild()
+        elif (stats['last_modified'] is not None
+              and stats['last_modified'] > self.last_modified):
+            self.apply_changes(self.last_modified)
+        if len(self.recipe_ids) != stats['count']:
+            self.apply_deletions()
+        self.ingredients_version = ingredients_version
+        self.last_modified = stats['last_modified'] or self.last_modified
+        self._refreshed_at = time.monotonic()
+
+    def is_stale(self):
+        return (self._refreshed_at is None
+                or time.monotonic() - self._refreshed_at
+                >= self.refresh_interval)
+
+    def search(self, query):
+        """Возвращает {recipe_id: релевантность} для рецептов запроса."""
+        scores = None
+        with self._lock:
+            if self.is_stale():
+                self.refresh()
+            for term in set(tokenize(query)):
+                start, end = find_prefix(self.keys, term)
+                term_scores = defaultdict(float)
+                for token in self.keys[start:end]:
+                    for recipe_id, weight in self.postings[token].items():
+                        term_scores[recipe_id] += weight
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {
+                        recipe_id: score + term_scores[recipe_id]
+                        for recipe_id, score in scores.items()
+                        if recipe_id in term_scores
+                    }
+        return scores or {}
+
+
+recipe_index = RecipeSearchIndex()
+
+
+def search_recipes(queryset, query):
+    """
+    Оставляет рецепты, подходящие под запрос, и сортирует их по
+    релевантности (аннотация search_rank). С PostgreSQL используется
+    GIN-индекс по Recipe.search_vector, иначе индекс в памяти.
+    """
+    if settings.FULL_TEXT_SEARCH:
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(
+            query, config=settings.FULL_TEXT_SEARCH_CONFIG
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-id')
+
+    scores = sorted(
+        recipe_index.search(query).items(),
+        key=lambda item: (-item[1], -item[0])
+    )[:SEARCH_FALLBACK_LIMIT]
+    # Различных значений релевантности немного: одно условие на значение
+    ids_by_score = defaultdict(list)
+    for recipe_id, score in scores:
+        ids_by_score[round(score, 4)].append(recipe_id)
+    return queryset.filter(
+        id__in=[recipe_id for recipe_id, _ in scores]
+    ).annotate(
+        search_rank=Case(
+            *(When(id__in=ids, then=Value(score))
+              for score, ids in ids_by_score.items()),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    ).order_by('-search_rank', '-id')
+
+
+class RecipeIngredientIndex:
+    """
+    Инвертированный индекс ингредиент -> отсортированный массив id
+    рецептов для подбора рецептов по имеющимся продуктам. Массивы array
+    занимают по 8 байт на связь. Индекс синхронизируется с БД не чаще
+    раза в refresh_interval секунд: догружаются рецепты, у которых
+    updated_at новее последнего просмотренного (состав меняется вместе
+    с сохранением рецепта), а удаленные рецепты находятся сравнением
+    множеств id и убираются из индекса без полной перестройки.
+    """
+    # Транзакция могла зафиксироваться позже, чем выставлен updated_at
+    overlap = timedelta(minutes=1)
+
+    def __init__(self, refresh_interval=5):
+        self.refresh_interval = refresh_interval
+        self.postings = {}
+        self.components = {}
+        self.recipe_ids = set()
+        self.last_modified = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        postings = defaultdict(list)
+        components = defaultdict(list)
+        rows = Component.objects.order_by('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.values_list(
+                'ingredient_id', 'recipe_id').iterator():
+            postings[ingredient_id].append(recipe_id)
+            components[recipe_id].append(ingredient_id)
+        self.postings = {
+            ingredient_id: array('q', recipe_ids)
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self.components = {
+            recipe_id: tuple(ingredient_ids)
+            for recipe_id, ingredient_ids in components.items()
+        }
+        self.recipe_ids = set(Recipe.objects.values_list('id', flat=True))
+
+    def remove_recipe(self, recipe_id):
+        for ingredient_id in self.components.pop(recipe_id, ()):
+            recipe_ids = self.postings[ingredient_id]
+            del recipe_ids[bisect_left(recipe_ids, recipe_id)]
+
+    def add_recipe(self, recipe_id, ingredient_ids):
+        for ingredient_id in ingredient_ids:
+            insort(
+                self.postings.setdefault(ingredient_id, array('q')),
+                recipe_id
+            )
+        self.components[recipe_id] = tuple(ingredient_ids)
+
+    def apply_changes(self, since):
+        """Перечитывает состав рецептов, измененных начиная с since."""
+        changed = list(Recipe.objects.filter(
+            updated_at__gte=since - self.overlap
+        ).values_list('id', flat=True))
+        rows = Component.objects.filter(recipe_id__in=changed).values_list(
+            'recipe_id', 'ingredient_id'
+        )
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in rows:
+            ingredients[recipe_id].append(ingredient_id)
+        for recipe_id in changed:
+            self.remove_recipe(recipe_id)
+            if ingredients[recipe_id]:
+                self.add_recipe(recipe_id, ingredients[recipe_id])
+        self.recipe_ids.update(changed)
+
+    def apply_deletions(self):
+        """Убирает из индекса рецепты, которых больше нет в БД."""
+        recipe_ids = set(Recipe.objects.values_list('id', flat=True))
+        for recipe_id in self.recipe_ids - recipe_ids:
+            self.remove_recipe(recipe_id)
+        self.recipe_ids = recipe_ids
+
+    def refresh(self):
+        """Синхронизирует индекс с БД, вызывается под блокировкой."""
+        stats = Recipe.objects.aggregate(
+            count=Count('id'), last_modified=Max('updated_at')
+        )
+        if self.last_modified is None:
+            self.rebuild()
+        elif (stats['last_modified'] is not None
+              and stats['last_modified'] > self.last_modified):
+            self.apply_changes(self.last_modified)
+        if len(self.recipe_ids) != stats['count']:
+            self.apply_deletions()
+        self.last_modified = stats['last_modified'] or self.last_modified
+        self._refreshed_at = time.monotonic()
+
+    def is_stale(self):
+        return (self._refreshed_at is None
+                or time.monotonic() - self._refreshed_at
+                >= self.refresh_interval)
+
+    def rank(self, ingredient_ids):
+        """
+        Возвращает [(recipe_id, покрыто, не хватает)] для рецептов, где
+        есть хотя бы один из ingredient_ids: сначала те, где не хватает
+        меньше ингредиентов, затем с большим числом совпадений.
+        """
+        with self._lock:
+            if self.is_stale():
+                self.refresh()
+            covered = Counter(chain.from_iterable(
+                self.postings.get(ingredient_id, ())
+                for ingredient_id in set(ingredient_ids)
+            ))
+            ranked = [
+                (recipe_id, count, len(self.components[recipe_id]) - count)
+                for recipe_id, count in covered.items()
+            ]
+        ranked.sort(key=lambda item: (item[2], -item[1], -item[0]))
+        return ranked
+
+    def get_missing(self, recipe_id, ingredient_ids):
+        ingredient_ids = set(ingredient_ids)
+        with self._lock:
+            components = self.components.get(recipe_id, ())
+        return [
+            ingredient_id for ingredient_id in components
+            if ingredient_id not in ingredient_ids
+        ]
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
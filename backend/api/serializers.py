@@ -1,24 +1,56 @@
-import base64
-
-from django.core.files.base import ContentFile
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+from recipe.images import schedule_image_variants
 from recipe.models import (Component, Favorite, Ingredient, Recipe,
                            ShoppingCart, Tag)
 from rest_framework import serializers
 from users.models import Subscribe, User
 
-from .utils import ingredients_set
+from .cache import get_tags
+from .utils import (ImageDecodeError, decode_base64_image, ingredients_set,
+                    ingredients_update, lock_recipe, update_recipe_cart_totals)
 
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'too_large': 'Размер картинки превышает {max_size} байт.',
+        'unknown_format': 'Неподдерживаемый формат картинки.',
+        'invalid_base64': 'Некорректные данные картинки в base64.',
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            _, separator, imgstr = data.partition(';base64,')
+            if not separator:
+                self.fail('invalid_base64')
+            try:
+                data = decode_base64_image(imgstr)
+            except ImageDecodeError as error:
+                self.fail(error.code, **error.params)
 
         return super().to_internal_value(data)
 
 
+def get_variant_urls(variants, request=None):
+    """Ссылки {вариант: url} на копии картинки из Recipe.image_variants."""
+    urls = {}
+    for variant, name in variants.items():
+        url = default_storage.url(name)
+        urls[variant] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Ссылки на уменьшенные копии картинки {вариант: url}. Пока копии
+    не построены, словарь пустой и клиент использует поле image.
+    """
+    def to_representation(self, value):
+        return get_variant_urls(value, self.context.get('request'))
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -54,6 +86,9 @@ class AuthorSerializer(serializers.ModelSerializer):
         read_only_fields = ('is_subscribed',)
 
     def get_is_subscribed(self, obj):
+        # Флаг уже посчитан в RecipeQuerySet.with_related
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return Subscribe.objects.filter(
             user=user.id,
@@ -66,11 +101,12 @@ class RecipeListSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     ingredients = ComponentSerializer(many=True, source='components')
     author = AuthorSerializer(read_only=True)
+    images = ImageVariantsField(source='image_variants')
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image',
+                  'is_in_shopping_cart', 'name', 'image', 'images',
                   'text', 'cooking_time',)
         read_only_fields = (
             'is_favorite',
@@ -78,6 +114,9 @@ class RecipeListSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, obj):
+        # Флаг уже посчитан в RecipeViewSet.get_queryset
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -86,6 +125,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
             recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -94,10 +135,26 @@ class RecipeListSerializer(serializers.ModelSerializer):
             recipe=obj).exists()
 
 
+class RecipeCoverageSerializer(RecipeListSerializer):
+    """
+    Рецепт из подбора по продуктам: сколько ингредиентов рецепта
+    есть у пользователя и каких не хватает (id ингредиентов).
+    Покрытие посчитано заранее и передается в context['coverage'].
+    """
+    coverage = serializers.SerializerMethodField()
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('coverage',)
+
+    def get_coverage(self, obj):
+        covered, missing = self.context['coverage'][obj.id]
+        return {'covered': covered, 'missing': missing}
+
+
 class ComponentCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient', queryset=Ingredient.objects.all()
-    )
+    # Существование ингредиентов проверяется одним запросом
+    # в RecipeSerializer.validate_ingredients
+    id = serializers.IntegerField(source='ingredient_id')
     amount = serializers.IntegerField()
 
     class Meta:
@@ -107,8 +164,7 @@ class ComponentCreateSerializer(serializers.ModelSerializer):
 
 class RecipeSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField()
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all())
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -137,6 +193,26 @@ class RecipeSerializer(serializers.ModelSerializer):
             user=user.id,
             recipe=obj).exists()
 
+    def validate_ingredients(self, value):
+        ids = {ingredient['ingredient_id'] for ingredient in value}
+        existing = set(Ingredient.objects.filter(
+            id__in=ids
+        ).values_list('id', flat=True))
+        if ids - existing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не существуют: {sorted(ids - existing)}'
+            )
+        return value
+
+    def validate_tags(self, value):
+        _, tags = get_tags()
+        missing = set(value) - {tag.id for tag in tags}
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не существуют: {sorted(missing)}'
+            )
+        return value
+
     def validate(self, data):
         ingredients = self.initial_data.get('ingredients')
         tags = self.initial_data.get('tags')
@@ -167,13 +243,29 @@ class RecipeSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        # Перечитываем рецепт по плану выборки списка: число запросов
+        # не зависит от количества ингредиентов
+        instance = Recipe.objects.with_related(request.user).get(
+            pk=instance.pk
+        )
         return RecipeListSerializer(
             instance,
             context={
-                'request': self.context.get('request')
+                'request': request
             }
         ).data
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Закрываем декодированный файл: хранилище уже забрало содержимое
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    @transaction.atomic
     def create(self, validated_data):
         """
         При POST-запросе создаем объект Рецепт,
@@ -190,34 +282,106 @@ class RecipeSerializer(serializers.ModelSerializer):
             recipe=recipe,
             ingredients_data=ingredients_data
         )
+        schedule_image_variants(recipe)
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """При PATCH-запросе переопределяем поля рецепта на новые."""
-        instance.image = validated_data.get('image', instance.image)
+        """
+        При PATCH-запросе переопределяем поля рецепта на новые.
+        Компоненты и теги меняются по разнице со старыми в одной
+        транзакции, поэтому читатели не видят рецепт без ингредиентов.
+        """
+        lock_recipe(instance)
+        if 'image' in validated_data:
+            instance.image = validated_data['image']
+            instance.image_variants = {}
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time)
 
-        if validated_data['ingredients']:
-            # Удаляем старые компоненты
-            instance.ingredients.clear()
-            # Устанавливаем новые
-            ingredients_set(
-                recipe=Recipe.objects.get(pk=instance.id),
+        if validated_data.get('ingredients'):
+            old_amounts, new_amounts = ingredients_update(
+                recipe=instance,
                 ingredients_data=validated_data['ingredients']
             )
+            update_recipe_cart_totals(
+                recipe=instance,
+                old_amounts=old_amounts,
+                new_amounts=new_amounts
+            )
 
-        if validated_data['tags']:
-            instance.tags.clear()
+        if validated_data.get('tags'):
+            # set() сам удаляет лишние и добавляет недостающие связи
             instance.tags.set(validated_data['tags'])
 
         instance.save()
+        if 'image' in validated_data:
+            schedule_image_variants(instance)
         return instance
 
 
+class ImportImageField(Base64ImageField):
+    """
+    Картинка в base64 или, только при импорте командой import_recipes
+    (context['allow_image_names']), имя картинки рецепта, уже лежащей
+    в хранилище: в каталоге upload_to картинок рецептов и открывающейся
+    в Pillow. Через API ссылаться на чужие файлы нельзя.
+    """
+    default_error_messages = {
+        'name_forbidden': 'Передайте картинку в base64.',
+    }
+
+    def check_stored_image(self, name):
+        if not name.startswith(Recipe.image.field.upload_to):
+            self.fail('invalid_image')
+        try:
+            with default_storage.open(name) as file:
+                with Image.open(file) as image:
+                    image.verify()
+        except (SuspiciousFileOperation, OSError,
+                Image.DecompressionBombError):
+            self.fail('invalid_image')
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or data.startswith('data:'):
+            return super().to_internal_value(data)
+        if not self.context.get('allow_image_names'):
+            self.fail('name_forbidden')
+        self.check_stored_image(data)
+        return data
+
+
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """
+    Проверка одной строки пакетного импорта без запросов к БД:
+    существование ингредиентов и тегов проверяется сразу для пачки.
+    """
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False)
+    ingredients = ComponentCreateSerializer(many=True, allow_empty=False)
+    image = ImportImageField()
+
+    class Meta:
+        model = Recipe
+        fields = ('tags', 'ingredients', 'name', 'image',
+                  'text', 'cooking_time',)
+
+    def validate_ingredients(self, value):
+        ids = [ingredient['ingredient_id'] for ingredient in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не могут повторяться'
+            )
+        if any(ingredient['amount'] <= 0 for ingredient in value):
+            raise serializers.ValidationError(
+                'Некорректный ввод количества ингредиентов'
+            )
+        return value
+
+
 class ShoppingCartSerializer(serializers.ModelSerializer):
     id = serializers.PrimaryKeyRelatedField(
         source='recipe',
@@ -228,13 +392,14 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(
         source='recipe.image',
         read_only=True)
+    images = ImageVariantsField(source='recipe.image_variants')
     cooking_time = serializers.IntegerField(
         source='recipe.cooking_time',
         read_only=True)
 
     class Meta:
         model = ShoppingCart
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -247,17 +412,20 @@ class FavoriteSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(
         source='recipe.image',
         read_only=True)
+    images = ImageVariantsField(source='recipe.image_variants')
     coocking_time = serializers.IntegerField(
         source='recipe.cooking_time',
         read_only=True)
 
     class Meta:
         model = Favorite
-        fields = ('id', 'name', 'image', 'coocking_time')
+        fields = ('id', 'name', 'image', 'images', 'coocking_time')
 
 
 class RecipeForSubscribeSerializer(serializers.ModelSerializer):
     """Сериализатор для вывода рецептов при подписке."""
+    images = ImageVariantsField(source='image_variants')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'cooking_time', 'image',)
+        fields = ('id', 'name', 'cooking_time', 'image', 'images',)
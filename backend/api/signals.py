@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipe.models import Component, Ingredient, Recipe, Tag
+from recipe.search import schedule_search_update
+
+from .cache import reference_cache
+from .metrics import record_query
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    # Список оберток живет в объекте подключения и переживает переподключения
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_reference_cache(sender, **kwargs):
+    # До фиксации транзакции другие запросы еще читают старые строки и
+    # закэшировали бы их под новой версией
+    transaction.on_commit(lambda: reference_cache.invalidate(sender))
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, **kwargs):
+    schedule_search_update([instance.id])
+
+
+@receiver((post_save, post_delete), sender=Component)
+def update_component_search_vector(sender, instance, **kwargs):
+    schedule_search_update([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        schedule_search_update(list(Component.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True)))
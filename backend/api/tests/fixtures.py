@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from recipe.models import Component, Ingredient, Recipe, Tag
+from users.models import User
+
+# Картинка GIF 1x1
+GIF = (b'GIF89a\x01\x00\x01\x00\x00\x00\x00!\xf9\x04\x01\x00\x00\x00\x00,'
+       b'\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x01\x00\x00')
+COLORS = ('#FF0000', '#E26C2D', '#FFFF00')
+
+
+class TempMediaMixin:
+    """Файлы тестов пишутся во временный MEDIA_ROOT."""
+    @classmethod
+    def setUpClass(cls):
+        cls._media_root = tempfile.mkdtemp()
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media_root)
+        cls._media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        first_name=username, last_name=username, password='password',
+    )
+
+
+def create_tags(count=2):
+    return [
+        Tag.objects.create(name=f'Тег {index}', color=COLORS[index],
+                           slug=f'tag{index}')
+        for index in range(count)
+    ]
+
+
+def create_ingredients(count=3):
+    return [
+        Ingredient.objects.create(name=f'Ингредиент {index}',
+                                  measurement_unit='г')
+        for index in range(count)
+    ]
+
+
+def create_recipe(author, name='Рецепт', tags=(), ingredients=(), **kwargs):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text='Описание', cooking_time=10,
+        image=SimpleUploadedFile('recipe.gif', GIF, 'image/gif'), **kwargs
+    )
+    recipe.tags.set(tags)
+    Component.objects.bulk_create([
+        Component(recipe=recipe, ingredient=ingredient, amount=index + 1)
+        for index, ingredient in enumerate(ingredients)
+    ])
+    return recipe
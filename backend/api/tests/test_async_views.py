@@ -0,0 +1,97 @@
+from api import urls as api_urls
+from api.async_views import ASGIHandler, make_async
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import TransactionTestCase, override_settings
+from django.urls import include, path, reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .fixtures import (TempMediaMixin, create_ingredients, create_recipe,
+                       create_tags, create_user)
+
+# Все маршруты с потоковыми ответами (их генераторы читают БД)
+# и строка, которая должна быть в теле ответа
+STREAMING_ROUTES = (
+    ('recipes-download-shopping-cart', 'Ингредиент 0'),
+    ('recipes-export', '"name": "Рецепт"'),
+)
+
+# URL-схема режима ASGI (ASYNC_VIEWS=True)
+urlpatterns = [
+    path('api/', include((
+        make_async(api_urls.router.urls) + list(api_urls.urlpatterns[1:]),
+        'api'
+    ))),
+]
+
+
+async def asgi_get(path, token, query=''):
+    """GET через ASGIHandler: статус и тело ответа."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await ASGIHandler()({
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [
+            (b'host', b'localhost'),
+            (b'authorization', f'Token {token}'.encode()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }, receive, send)
+    return messages[0]['status'], b''.join(
+        message.get('body', b'') for message in messages[1:])
+
+
+class StreamingASGITest(TempMediaMixin, TransactionTestCase):
+    """
+    Потоковые ответы под ASGI: и через асинхронные обертки, и через
+    обычные view. View выполняются в других потоках, поэтому нужен
+    TransactionTestCase.
+    """
+    def setUp(self):
+        user = create_user('cook')
+        self.token = Token.objects.create(user=user).key
+        recipe = create_recipe(
+            user, tags=create_tags(), ingredients=create_ingredients())
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assertEqual(response.status_code, 201)
+
+    def test_streaming_routes(self):
+        for urlconf in (settings.ROOT_URLCONF, __name__):
+            for route, expected in STREAMING_ROUTES:
+                with self.subTest(urlconf=urlconf, route=route):
+                    with override_settings(ROOT_URLCONF=urlconf):
+                        status, body = async_to_sync(asgi_get)(
+                            reverse(f'api:{route}'), self.token)
+                    self.assertEqual(status, 200, body)
+                    self.assertIn(expected.encode(), body)
+
+    @override_settings(ROOT_URLCONF=__name__, ASYNC_STREAM_BUFFER=1)
+    def test_chunked_download(self):
+        handler_chunk_size = ASGIHandler.chunk_size
+        ASGIHandler.chunk_size = 16
+        try:
+            status, body = async_to_sync(asgi_get)(
+                reverse('api:recipes-download-shopping-cart'), self.token,
+                'format=txt')
+        finally:
+            ASGIHandler.chunk_size = handler_chunk_size
+        self.assertEqual(status, 200, body)
+        self.assertEqual(body.decode().count('Ингредиент'), 3)
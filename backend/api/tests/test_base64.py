@@ -0,0 +1,42 @@
+import base64
+from io import BytesIO
+
+from api.serializers import Base64ImageField
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Картинка в base64 декодируется строго, пробелы не в счет размера."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        content = BytesIO()
+        Image.new('RGB', (4, 4)).save(content, 'PNG')
+        cls.raw = content.getvalue()
+        cls.encoded = base64.b64encode(cls.raw).decode()
+
+    def decode(self, encoded):
+        field = Base64ImageField()
+        return field.to_internal_value(f'data:image/png;base64,{encoded}')
+
+    def test_whitespace(self):
+        wrapped = '\n'.join(
+            self.encoded[start:start + 4]
+            for start in range(0, len(self.encoded), 4)
+        )
+        with override_settings(IMAGE_MAX_UPLOAD_SIZE=len(self.raw)):
+            self.assertEqual(self.decode(wrapped).read(), self.raw)
+
+    def test_invalid_characters(self):
+        for encoded in (
+            self.encoded[:8] + '*' + self.encoded[8:],
+            self.encoded[:8] + 'ё' + self.encoded[8:],
+            self.encoded[:8] + '====' + self.encoded[8:],
+        ):
+            with self.subTest(encoded=encoded[:12]):
+                with self.assertRaises(ValidationError) as context:
+                    self.decode(encoded)
+                self.assertEqual(
+                    context.exception.detail[0].code, 'invalid_base64')
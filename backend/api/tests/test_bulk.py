@@ -0,0 +1,126 @@
+import base64
+import json
+from io import BytesIO
+from unittest import mock
+
+from api.bulk import RecipeImporter
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+from recipe.models import Recipe
+from rest_framework.test import APIClient
+
+from .fixtures import (TempMediaMixin, create_ingredients, create_recipe,
+                       create_tags, create_user)
+
+
+class ImportImageNameTest(TempMediaMixin, TestCase):
+    """Имена файлов вместо картинок принимает только import_recipes."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.importer = create_user('importer')
+        cls.tags = create_tags()
+        cls.ingredients = create_ingredients()
+
+    def setUp(self):
+        self.recipe = create_recipe(
+            self.owner, tags=self.tags, ingredients=self.ingredients)
+        content = BytesIO()
+        Image.new('RGB', (4, 4)).save(content, 'PNG')
+        self.png = default_storage.save(
+            'media/stored.png', ContentFile(content.getvalue()))
+        self.text = default_storage.save(
+            'media/notes.txt', ContentFile(b'not an image'))
+
+    def get_line(self, image):
+        return json.dumps({
+            'name': 'Импорт', 'text': 'Описание', 'cooking_time': 5,
+            'image': image, 'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 2}],
+        })
+
+    def test_api_rejects_image_names(self):
+        client = APIClient()
+        client.force_authenticate(self.importer)
+        for image in (self.recipe.image.name, self.png):
+            with self.subTest(image=image):
+                response = client.post(
+                    '/api/recipes/bulk/', self.get_line(image),
+                    content_type='application/x-ndjson')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.json()['errors'][0]['errors'])
+        self.assertFalse(
+            Recipe.objects.filter(author=self.importer).exists())
+
+    def test_command_checks_stored_image(self):
+        importer = RecipeImporter(self.importer, allow_image_names=True)
+        report = importer.run([
+            self.get_line(self.png),
+            self.get_line(self.text),
+            self.get_line('media/missing.png'),
+            self.get_line('../foodgram/settings.py'),
+        ])
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(
+            [error['line'] for error in report['errors']], [2, 3, 4])
+        self.assertEqual(
+            Recipe.objects.get(author=self.importer).image.name, self.png)
+
+
+class BulkImportBatchTest(TempMediaMixin, TestCase):
+    """API импортирует пачками по RECIPE_IMPORT_BATCH_SIZE рецептов."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.tags = create_tags()
+        cls.ingredients = create_ingredients()
+
+    def get_line(self, number):
+        content = BytesIO()
+        Image.new('RGB', (4, 4)).save(content, 'PNG')
+        image = base64.b64encode(content.getvalue()).decode()
+        return json.dumps({
+            'name': f'Рецепт {number}', 'text': 'Описание',
+            'cooking_time': 5, 'image': f'data:image/png;base64,{image}',
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 2}],
+        })
+
+    @override_settings(RECIPE_IMPORT_BATCH_SIZE=2)
+    def test_api_batch_size(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.object(
+            RecipeImporter, 'import_batch', autospec=True,
+            side_effect=RecipeImporter.import_batch,
+        ) as import_batch:
+            response = client.post(
+                '/api/recipes/bulk/',
+                '\n'.join(self.get_line(number) for number in range(5)),
+                content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 5)
+        self.assertEqual(
+            [len(call[0][1]) for call in import_batch.call_args_list],
+            [2, 2, 1])
+
+    def test_undecodable_line(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        body = b'\n'.join((
+            self.get_line(0).encode(),
+            'не UTF-8'.encode('cp1251'),
+            self.get_line(2).encode(),
+        ))
+        response = client.post(
+            '/api/recipes/bulk/', body,
+            content_type='application/x-ndjson; charset=utf-8')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {
+            'created': 2,
+            'errors': [
+                {'line': 2, 'errors': 'Некорректная кодировка строки'},
+            ],
+        })
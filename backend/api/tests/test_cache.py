@@ -0,0 +1,56 @@
+from unittest import mock
+
+from api.cache import get_tags, reference_cache
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from recipe.models import Tag
+
+from .fixtures import create_tags
+
+
+@override_settings(REFERENCE_CACHE_LOCAL_TIMEOUT=60)
+class LocalReferenceCacheTest(TestCase):
+    """С LocMemCache правки из других процессов видны не позже таймаута."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = create_tags(1)[0]
+
+    def setUp(self):
+        cache.clear()
+        reference_cache._local.clear()
+
+    def test_version_expires(self):
+        now = 1000000.0
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=now):
+            version, tags = get_tags()
+            # update не шлет сигналов, как правка в другом процессе
+            Tag.objects.filter(pk=self.tag.pk).update(name='Другой')
+            self.assertEqual(get_tags(), (version, tags))
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=now + 61):
+            new_version, tags = get_tags()
+        self.assertNotEqual(new_version, version)
+        self.assertEqual([tag.name for tag in tags], ['Другой'])
+
+
+class ReferenceCacheInvalidationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = create_tags(1)[0]
+
+    def setUp(self):
+        cache.clear()
+        reference_cache._local.clear()
+
+    def test_invalidated_after_commit(self):
+        stale = list(Tag.objects.all())
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.tag.name = 'Другой'
+                self.tag.save()
+                # Параллельный запрос видит строки до фиксации
+                reference_cache.get(Tag, 'list', lambda: stale)
+        _, tags = get_tags()
+        self.assertEqual([tag.name for tag in tags], ['Другой'])
@@ -0,0 +1,59 @@
+from unittest import mock
+
+from api import utils
+from django.test import TestCase
+from recipe.models import ShoppingCartTotal
+from rest_framework.test import APIClient
+
+from .fixtures import (TempMediaMixin, create_ingredients, create_recipe,
+                       create_tags, create_user)
+
+
+class CartTotalsTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.tags = create_tags(1)
+        cls.ingredients = create_ingredients(3)
+        cls.recipe = create_recipe(cls.author, tags=cls.tags,
+                                   ingredients=cls.ingredients[:2])
+
+    def get_totals(self):
+        return dict(ShoppingCartTotal.objects.filter(
+            user=self.user).values_list('ingredient_id', 'amount'))
+
+    def test_concurrent_first_insert(self):
+        ingredient = self.ingredients[0]
+        ShoppingCartTotal.objects.create(
+            user=self.user, ingredient=ingredient, amount=5)
+        lock = utils.lock_cart_totals
+        # Строку вставил другой запрос после первого чтения
+        with mock.patch.object(utils, 'lock_cart_totals', side_effect=[
+                {}, lock([self.user.id], [ingredient.id])]):
+            utils.update_cart_totals([self.user.id], {ingredient.id: 3})
+        self.assertEqual(self.get_totals(), {ingredient.id: 8})
+
+    def test_totals_follow_recipe_changes(self):
+        reader = APIClient()
+        reader.force_authenticate(self.user)
+        author = APIClient()
+        author.force_authenticate(self.author)
+        url = f'/api/recipes/{self.recipe.id}/'
+        first, second, third = self.ingredients
+
+        response = reader.post(f'{url}shopping_cart/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_totals(), {first.id: 1, second.id: 2})
+
+        response = author.patch(url, {
+            'ingredients': [{'id': second.id, 'amount': 4},
+                            {'id': third.id, 'amount': 7}],
+            'tags': [self.tags[0].id],
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get_totals(), {second.id: 4, third.id: 7})
+
+        self.assertEqual(author.delete(url).status_code, 204)
+        self.assertEqual(self.get_totals(), {})
@@ -0,0 +1,84 @@
+from api.fast_serializers import (FastRecipeListSerializer,
+                                  FastSubscribeSerializer)
+from api.renderers import FastJSONRenderer
+from api.serializers import RecipeListSerializer
+from api.utils import get_recipes_by_author
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase
+from recipe.models import Favorite, Recipe, ShoppingCart
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import Subscribe
+from users.serializers import SubscribeSerializer
+
+from .fixtures import (TempMediaMixin, create_ingredients, create_recipe,
+                       create_tags, create_user)
+
+
+class FastSerializersParityTest(TempMediaMixin, TestCase):
+    """Быстрые сериализаторы отдают тот же JSON байт в байт."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.silent = create_user('silent')
+        tags = create_tags(3)
+        ingredients = create_ingredients(3)
+        full = create_recipe(
+            cls.author, 'Полный рецепт', tags=tags, ingredients=ingredients,
+            image_variants={
+                'small': 'media/variants/recipe_small.jpg',
+                'small_webp': 'media/variants/recipe small.webp',
+            },
+        )
+        # Без тегов, ингредиентов и уменьшенных копий
+        create_recipe(cls.author, 'Пустой рецепт')
+        create_recipe(cls.user, 'Рецепт читателя', tags=tags[:1],
+                      ingredients=ingredients[1:])
+        Favorite.objects.create(user=cls.user, recipe=full)
+        ShoppingCart.objects.create(user=cls.user, recipe=full)
+        Subscribe.objects.create(user=cls.user, author=cls.author)
+        Subscribe.objects.create(user=cls.user, author=cls.silent)
+        cls.author.recipes_count = 2
+        cls.author.save()
+
+    @staticmethod
+    def get_request(user):
+        request = Request(APIRequestFactory().get('/api/'))
+        request.user = user
+        return request
+
+    def assert_same_json(self, serializer, fast_serializer, objs, context):
+        expected = JSONRenderer().render(
+            serializer(objs, many=True, context=context).data)
+        actual = fast_serializer(objs, many=True, context=context).data
+        self.assertEqual(JSONRenderer().render(actual), expected)
+        self.assertEqual(FastJSONRenderer().render(actual), expected)
+
+    def test_recipe_list(self):
+        for user in (AnonymousUser(), self.user):
+            with self.subTest(user=user):
+                recipes = list(Recipe.objects.with_related(user).order_by(
+                    '-pub_date', '-id'))
+                self.assertEqual(len(recipes), 3)
+                self.assert_same_json(
+                    RecipeListSerializer, FastRecipeListSerializer,
+                    recipes, {'request': self.get_request(user)})
+
+    def test_subscriptions(self):
+        subscribes = list(Subscribe.objects.filter(
+            user=self.user).select_related('author').order_by('id'))
+        for recipes_limit in (None, 1):
+            with self.subTest(recipes_limit=recipes_limit):
+                self.assert_same_json(
+                    SubscribeSerializer, FastSubscribeSerializer, subscribes,
+                    {
+                        'request': self.get_request(self.user),
+                        'recipes_by_author': get_recipes_by_author(
+                            [subscribe.author_id
+                             for subscribe in subscribes],
+                            limit=recipes_limit,
+                        ),
+                    },
+                )
@@ -0,0 +1,38 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+from users.models import Subscribe
+
+from .fixtures import TempMediaMixin, create_recipe, create_user
+
+
+class FeedTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        author = create_user('author')
+        Subscribe.objects.create(user=cls.user, author=author)
+        cls.recipes = [
+            create_recipe(author, f'Рецепт {index}') for index in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_pages(self):
+        response = self.client.get('/api/recipes/feed/?limit=2')
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.json()['results']]
+        response = self.client.get(response.json()['next'])
+        ids += [recipe['id'] for recipe in response.json()['results']]
+        self.assertIsNone(response.json()['next'])
+        self.assertEqual(
+            ids, [recipe.id for recipe in reversed(self.recipes)])
+
+    def test_ordering_params_rejected(self):
+        for query in ('ordering=popular', 'ordering=trending',
+                      'search=Рецепт'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/feed/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(query.split('=')[0], response.json())
@@ -0,0 +1,74 @@
+from base64 import b64decode, b64encode
+from urllib.parse import parse_qs, urlparse
+
+from api.pagination import RecipeCursorPagination
+from django.test import TestCase
+from recipe.models import Recipe
+from rest_framework.test import APIClient
+
+from .fixtures import TempMediaMixin, create_recipe, create_user
+
+
+def get_cursor(link):
+    return parse_qs(urlparse(link).query)['cursor'][0]
+
+
+class RecipeCursorPaginationTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.recipes = [
+            create_recipe(author, f'Рецепт {index}') for index in range(7)
+        ]
+        # Большинство рецептов без рейтинга: одинаковый ноль
+        Recipe.objects.filter(pk=cls.recipes[2].pk).update(
+            popularity_score=5)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, query):
+        response = self.client.get(f'/api/recipes/?limit=2&cursor=&{query}')
+        pages = [response.json()]
+        while pages[-1]['next']:
+            cursor = b64decode(get_cursor(pages[-1]['next'])).decode()
+            self.assertNotIn('o=', cursor)
+            pages.append(self.client.get(pages[-1]['next']).json())
+        return pages
+
+    def get_ids(self, pages):
+        return [recipe['id'] for page in pages for recipe in page['results']]
+
+    def test_ties_without_offsets(self):
+        expected = [self.recipes[2].id] + [
+            recipe.id for recipe in reversed(self.recipes)
+            if recipe != self.recipes[2]
+        ]
+        pages = self.walk('ordering=popular')
+        self.assertEqual(self.get_ids(pages), expected)
+        self.assertEqual(len(pages), 4)
+
+    def test_previous_link(self):
+        pages = self.walk('ordering=popular')
+        previous = self.client.get(pages[2]['previous']).json()
+        self.assertEqual(previous['results'], pages[1]['results'])
+
+    def test_get_cursor_matches_page(self):
+        pagination = RecipeCursorPagination()
+        ordering = ('-popularity_score', '-id')
+        recipes = list(Recipe.objects.order_by(*ordering))
+        cursor = pagination.get_cursor(recipes[3], ordering)
+        response = self.client.get(
+            '/api/recipes/',
+            {'ordering': 'popular', 'limit': 2, 'cursor': cursor})
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [recipe.id for recipe in recipes[4:6]])
+
+    def test_invalid_cursor(self):
+        for position in ('p=1', 'p=x,1'):
+            with self.subTest(position=position):
+                cursor = b64encode(position.encode()).decode()
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
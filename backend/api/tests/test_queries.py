@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipe.models import Favorite, ShoppingCart
+from rest_framework.test import APIClient
+
+from .fixtures import (TempMediaMixin, create_ingredients, create_recipe,
+                       create_tags, create_user)
+
+
+class RecipeListQueriesTest(TempMediaMixin, TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        authors = [create_user(f'author{index}') for index in range(3)]
+        tags = create_tags(3)
+        ingredients = create_ingredients(4)
+        recipes = [
+            create_recipe(
+                authors[index % len(authors)], f'Рецепт {index}',
+                tags=tags[:index % len(tags) + 1],
+                ingredients=ingredients[:index % len(ingredients) + 1],
+            )
+            for index in range(6)
+        ]
+        Favorite.objects.create(user=cls.user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=recipes[1])
+
+    def assert_flat(self, client):
+        # Первый запрос прогревает кэш тегов и ингредиентов
+        client.get('/api/recipes/?limit=1')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/?limit=1')
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertLessEqual(
+            len(queries),
+            settings.METRICS_BUDGETS['GET recipes-list']['queries'])
+        with self.assertNumQueries(len(queries)):
+            response = client.get('/api/recipes/?limit=50')
+        self.assertEqual(len(response.json()['results']), 6)
+
+    def test_query_count_is_flat(self):
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.user)
+        for fast in (True, False):
+            for name, client in (('anonymous', APIClient()),
+                                 ('authenticated', authenticated)):
+                with self.subTest(client=name, fast_serializers=fast):
+                    with override_settings(FAST_SERIALIZERS=fast):
+                        self.assert_flat(client)
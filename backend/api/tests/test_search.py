@@ -0,0 +1,84 @@
+from unittest import mock
+
+from api.search import RecipeIngredientIndex, RecipeSearchIndex
+from django.test import TestCase
+from recipe.models import Recipe
+
+from .fixtures import (TempMediaMixin, create_ingredients, create_recipe,
+                       create_user)
+
+
+class RecipeIngredientIndexTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.ingredients = create_ingredients(3)
+        cls.recipes = [
+            create_recipe(author, f'Рецепт {index}',
+                          ingredients=cls.ingredients[:index + 1])
+            for index in range(3)
+        ]
+
+    def get_ids(self):
+        return [ingredient.id for ingredient in self.ingredients[:2]]
+
+    def test_deleted_recipes_removed_without_rebuild(self):
+        index = RecipeIngredientIndex(refresh_interval=0)
+        self.assertEqual(len(index.rank(self.get_ids())), 3)
+        deleted = self.recipes[1]
+        deleted.delete()
+        with mock.patch.object(index, 'rebuild',
+                               side_effect=AssertionError('rebuild')):
+            ranked = index.rank(self.get_ids())
+        self.assertNotIn(deleted.id, [recipe_id for recipe_id, _, _ in ranked])
+        self.assertEqual(len(ranked), 2)
+        self.assertEqual(index.get_missing(deleted.id, self.get_ids()), [])
+        self.assertEqual(
+            index.get_missing(self.recipes[2].id, self.get_ids()),
+            [self.ingredients[2].id])
+
+    def test_refresh_throttled(self):
+        index = RecipeIngredientIndex(refresh_interval=60)
+        index.rank(self.get_ids())
+        with self.assertNumQueries(0):
+            index.rank(self.get_ids())
+        index._refreshed_at -= 60
+        with self.assertNumQueries(1):
+            index.rank(self.get_ids())
+
+
+class RecipeSearchIndexTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.ingredients = create_ingredients(2)
+        cls.recipes = [
+            create_recipe(cls.author, name, ingredients=cls.ingredients[:1])
+            for name in ('Яблочный пирог', 'Грушевый пирог')
+        ]
+
+    def test_changes_applied_without_rebuild(self):
+        index = RecipeSearchIndex(refresh_interval=0)
+        self.assertEqual(len(index.search('пирог')), 2)
+        apple, pear = self.recipes
+        pear.delete()
+        apple.name = 'Яблочный штрудель'
+        apple.save()
+        added = create_recipe(self.author, 'Штрудель с вишней')
+        with mock.patch.object(index, 'rebuild',
+                               side_effect=AssertionError('rebuild')):
+            self.assertEqual(set(index.search('пирог')), set())
+            self.assertEqual(
+                set(index.search('штрудель')), {apple.id, added.id})
+            self.assertEqual(set(index.search('яблоч штрудель')), {apple.id})
+        self.assertNotIn('груш', ''.join(index.keys))
+        self.assertEqual(index.recipe_ids, {apple.id, added.id})
+
+    def test_refresh_throttled(self):
+        index = RecipeSearchIndex(refresh_interval=60)
+        index.search('пирог')
+        Recipe.objects.filter(id=self.recipes[0].id).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(index.search('пирог')), 2)
+        index._refreshed_at -= 60
+        self.assertEqual(len(index.search('пирог')), 1)
@@ -1,4 +1,6 @@
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from api.async_views import make_async
+from api.views import IngredientViewSet, MetricsView, RecipeViewSet, TagViewSet
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 from users.views import UserViewSet
@@ -11,7 +13,12 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', UserViewSet, basename='users')
 
+router_urls = router.urls
+if settings.ASYNC_VIEWS:
+    router_urls = make_async(router_urls)
+
 urlpatterns = (
-    path('', include(router.urls)),
+    path('', include(router_urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('_metrics', MetricsView.as_view(), name='metrics'),
 )
@@ -1,20 +1,322 @@
-from recipe.models import Component
+import base64
+import binascii
+import logging
+import time
+from collections import Counter, defaultdict
+from io import BytesIO
+from itertools import chain
+
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from recipe.models import Component, Recipe, ShoppingCart, ShoppingCartTotal
+
+logger = logging.getLogger(__name__)
+
+# Сигнатуры начала файла: (смещение, байты, расширение, MIME-тип)
+IMAGE_SIGNATURES = (
+    (0, b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (0, b'GIF87a', 'gif', 'image/gif'),
+    (0, b'GIF89a', 'gif', 'image/gif'),
+    (8, b'WEBP', 'webp', 'image/webp'),
+)
+
+# Кратно 4, чтобы куски base64 декодировались независимо
+BASE64_CHUNK_SIZE = 64 * 1024
+# Пробелы и переводы строк, которые допускаются внутри base64
+BASE64_WHITESPACE = ' \t\n\r\v\f'
+BASE64_STRIP = str.maketrans('', '', BASE64_WHITESPACE)
+
+
+class ImageDecodeError(ValueError):
+    def __init__(self, code, **params):
+        super().__init__(code)
+        self.code = code
+        self.params = params
+
+
+def sniff_image_type(head):
+    for offset, signature, extension, content_type in IMAGE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return extension, content_type
+    return None
+
+
+def get_base64_length(encoded):
+    """Длина base64 без пробелов и переводов строк."""
+    return len(encoded) - sum(map(encoded.count, BASE64_WHITESPACE))
+
+
+def iter_base64_chunks(encoded):
+    """
+    Декодирует base64 по кускам, пропуская пробелы и переводы строк.
+    Символы не из алфавита base64 и данные после паддинга вызывают
+    binascii.Error, а не пропускаются, как в a2b_base64.
+    """
+    tail = ''
+    padded = False
+    for start in range(0, len(encoded), BASE64_CHUNK_SIZE):
+        chunk = tail + encoded[
+            start:start + BASE64_CHUNK_SIZE].translate(BASE64_STRIP)
+        usable = len(chunk) - len(chunk) % 4
+        tail = chunk[usable:]
+        if not usable:
+            continue
+        if padded:
+            raise binascii.Error('Excess data after padding')
+        try:
+            yield base64.b64decode(chunk[:usable], validate=True)
+        except ValueError:
+            # Не ASCII-символы b64decode отклоняет с ValueError
+            raise binascii.Error('Invalid base64 data') from None
+        padded = chunk[usable - 1] == '='
+    if tail:
+        raise binascii.Error('Incorrect padding')
+
+
+def write_chunks(file, chunks, max_size):
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise ImageDecodeError('too_large', max_size=max_size)
+            file.write(chunk)
+    except binascii.Error:
+        raise ImageDecodeError('invalid_base64') from None
+    return size
+
+
+def decode_base64_image(encoded, max_size=None):
+    """
+    Декодирует картинку из base64 по кускам в загруженный файл Django:
+    небольшие остаются в памяти, крупные пишутся во временный файл.
+    Слишком большие данные отклоняются до декодирования, формат
+    определяется по первым байтам, а не по заголовку data URI.
+    """
+    started = time.perf_counter()
+    max_size = max_size or settings.IMAGE_MAX_UPLOAD_SIZE
+    # Размер после декодирования известен заранее с точностью до паддинга
+    expected_size = get_base64_length(encoded) // 4 * 3
+    if expected_size > max_size + 2:
+        raise ImageDecodeError('too_large', max_size=max_size)
+
+    chunks = iter_base64_chunks(encoded)
+    try:
+        head = next(chunks, b'')
+    except binascii.Error:
+        raise ImageDecodeError('invalid_base64') from None
+    image_type = sniff_image_type(head)
+    if image_type is None:
+        raise ImageDecodeError('unknown_format')
+    extension, content_type = image_type
+
+    if expected_size <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        file = InMemoryUploadedFile(
+            BytesIO(), None, f'temp.{extension}', content_type, 0, None
+        )
+    else:
+        file = TemporaryUploadedFile(
+            f'temp.{extension}', content_type, 0, None
+        )
+    try:
+        size = write_chunks(file, chain((head,), chunks), max_size)
+    except ImageDecodeError:
+        file.close()
+        raise
+
+    file.size = size
+    file.seek(0)
+    logger.debug(
+        'Картинка %s (%s байт) декодирована за %.1f мс',
+        file.name, size, (time.perf_counter() - started) * 1000
+    )
+    return file
 
 
 def ingredients_set(recipe, ingredients_data):
     Component.objects.bulk_create([Component(
-        ingredient=ingredient['ingredient'],
+        ingredient_id=ingredient['ingredient_id'],
         recipe=recipe,
         amount=ingredient['amount']
     ) for ingredient in ingredients_data])
 
 
-def create_content(ingredients):
-    content = 'Ваш список покупок:\n'
+def ingredients_update(recipe, ingredients_data):
+    """
+    Приводит компоненты рецепта к ingredients_data, меняя только
+    отличающиеся строки: пачкой удаляет, обновляет amount и добавляет.
+    Возвращает количества до и после {ingredient_id: amount}.
+    """
+    components = {
+        component.ingredient_id: component
+        for component in Component.objects.filter(recipe=recipe)
+    }
+    old_amounts = Counter({
+        ingredient_id: component.amount
+        for ingredient_id, component in components.items()
+    })
+    new_amounts = Counter({
+        ingredient['ingredient_id']: ingredient['amount']
+        for ingredient in ingredients_data
+    })
+
+    to_delete = [
+        component.id for ingredient_id, component in components.items()
+        if ingredient_id not in new_amounts
+    ]
+    to_update, to_create = [], []
+    for ingredient_id, amount in new_amounts.items():
+        component = components.get(ingredient_id)
+        if component is None:
+            to_create.append(Component(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            ))
+        elif component.amount != amount:
+            component.amount = amount
+            to_update.append(component)
+
+    if to_delete:
+        Component.objects.filter(id__in=to_delete).delete()
+    Component.objects.bulk_update(to_update, ['amount'])
+    Component.objects.bulk_create(to_create)
+    return old_amounts, new_amounts
+
+
+def get_recipe_amounts(recipe):
+    """Возвращает количества ингредиентов рецепта {ingredient_id: amount}."""
+    return Counter(dict(
+        Component.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', 'amount')
+    ))
+
+
+def lock_recipe(recipe):
+    """
+    Блокирует строку рецепта до конца транзакции. Правка состава,
+    удаление рецепта и изменение списков покупок с ним идут по очереди,
+    иначе одно из изменений не попадет в итоги списков покупок.
+    """
+    list(Recipe.objects.select_for_update().filter(
+        pk=recipe.pk
+    ).values_list('pk', flat=True))
+
+
+def lock_cart_totals(user_ids, ingredient_ids):
+    return {
+        (total.user_id, total.ingredient_id): total
+        for total in ShoppingCartTotal.objects.select_for_update().filter(
+            user_id__in=user_ids,
+            ingredient_id__in=ingredient_ids
+        )
+    }
+
+
+def update_cart_totals(user_ids, amounts):
+    """
+    Прибавляет amounts ({ingredient_id: изменение}) к итогам списков
+    покупок пользователей. Строки с нулевым количеством удаляются.
+    """
+    amounts = {key: value for key, value in amounts.items() if value}
+    if not user_ids or not amounts:
+        return
+
+    with transaction.atomic():
+        totals = lock_cart_totals(user_ids, amounts)
+        # Недостающие строки создаются пустыми без ошибки, если их
+        # параллельно вставил другой запрос, и прибавление идет ниже
+        # под блокировкой
+        missing = [
+            ShoppingCartTotal(
+                user_id=user_id, ingredient_id=ingredient_id, amount=0
+            )
+            for user_id in user_ids
+            for ingredient_id, amount in amounts.items()
+            if amount > 0 and (user_id, ingredient_id) not in totals
+        ]
+        if missing:
+            ShoppingCartTotal.objects.bulk_create(
+                missing, ignore_conflicts=True
+            )
+            totals.update(lock_cart_totals(
+                {total.user_id for total in missing},
+                {total.ingredient_id for total in missing}
+            ))
+
+        to_update, to_delete = [], []
+        for total in totals.values():
+            total.amount += amounts[total.ingredient_id]
+            if total.amount > 0:
+                to_update.append(total)
+            else:
+                to_delete.append(total.id)
+
+        ShoppingCartTotal.objects.bulk_update(to_update, ['amount'])
+        if to_delete:
+            ShoppingCartTotal.objects.filter(id__in=to_delete).delete()
+
+
+def update_recipe_cart_totals(recipe, old_amounts, new_amounts):
+    """
+    Переносит изменение состава рецепта в итоги списков покупок
+    всех пользователей, у которых рецепт в корзине.
+    """
+    amounts = Counter(new_amounts)
+    amounts.subtract(old_amounts)
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe=recipe
+    ).values_list('user_id', flat=True))
+    update_cart_totals(user_ids, amounts)
+
+
+def update_counters(model, pk, **deltas):
+    """
+    Меняет денормализованные счетчики объекта на deltas одним UPDATE
+    с F()-выражениями, без чтения строки и гонок между запросами.
+    Счетчик не опускается ниже нуля, если разошелся с данными (например,
+    после правок через админку) - его исправит rebuild_counters.
+    """
+    model.objects.filter(pk=pk).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def get_recipes_by_author(author_ids, limit=None):
+    """
+    Возвращает словарь {author_id: [рецепты]} с последними рецептами
+    авторов одним запросом. При заданном limit берем первые limit рецептов
+    каждого автора через ROW_NUMBER, если СУБД поддерживает оконные функции.
+    """
+    recipes_by_author = defaultdict(list)
+    if not author_ids:
+        return recipes_by_author
+
+    if limit is not None and connection.features.supports_over_clause:
+        table = Recipe._meta.db_table
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ('
+            f'SELECT r.*, ROW_NUMBER() OVER ('
+            f'PARTITION BY r.author_id ORDER BY r.pub_date DESC, r.id DESC'
+            f') AS rn FROM {table} r WHERE r.author_id IN ({placeholders})'
+            f') ranked WHERE ranked.rn <= %s ORDER BY ranked.rn',
+            [*author_ids, limit]
+        )
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        return recipes_by_author
 
-    for ingredient in ingredients:
-        content += (f"{ingredient['ingredient__name']} "
-                    + f"({ingredient['ingredient__measurement_unit']}) "
-                    + f"{ingredient['amount']}"
-                    + '\n')
-    return content
+    recipes = Recipe.objects.filter(
+        author_id__in=author_ids
+    ).order_by('-pub_date', '-id')
+    for recipe in recipes:
+        author_recipes = recipes_by_author[recipe.author_id]
+        if limit is None or len(author_recipes) < limit:
+            author_recipes.append(recipe)
+    return recipes_by_author
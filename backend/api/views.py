@@ -1,44 +1,109 @@
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import CustomPagination
-from django.db.models import Sum
-from django.http import HttpResponse
+from api.pagination import CustomPagination, FeedPagination, RecipePagination
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from recipe.models import (Component, Favorite, Ingredient, Recipe,
-                           ShoppingCart, Tag)
+from recipe.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                           ShoppingCartTotal, Tag)
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from users.models import User
 
+from .bulk import RecipeImporter, export_recipes
+from .cache import get_ingredients, get_tags
+from .fast_serializers import FastRecipeListSerializer
+from .feed import get_timeline
+from .metrics import TimedSerializer, registry
+from .mixins import CachedReferenceMixin, ConditionalRecipeMixin, MetricsMixin
+from .parsers import NDJSONParser
 from .permissions import IsAuthorOrReadOnly
+from .renderers import (SHOPPING_LIST_RENDERERS, NDJSONRenderer,
+                        PrometheusRenderer)
+from .search import ingredient_index, recipe_ingredient_index
 from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          RecipeListSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, TagSerializer)
-from .utils import create_content
+                          RecipeCoverageSerializer, RecipeListSerializer,
+                          RecipeSerializer, ShoppingCartSerializer,
+                          TagSerializer)
+from .utils import (get_recipe_amounts, lock_recipe, update_cart_totals,
+                    update_counters, update_recipe_cart_totals)
 
 
-class IngredientViewSet(mixins.ListModelMixin,
+class IngredientViewSet(MetricsMixin,
+                        CachedReferenceMixin,
+                        mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
                         viewsets.GenericViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filter_class = IngredientFilter
+    reference_getter = staticmethod(get_ingredients)
+
+    def filter_reference(self, objects):
+        """
+        Автодополнение по ?name= отдается из индекса в памяти: сначала
+        ингредиенты, начинающиеся с name, затем содержащие его.
+        """
+        return ingredient_index.search(
+            self.request.query_params.get('name', '')
+        )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(MetricsMixin,
+                    ConditionalRecipeMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     permission_classes = (IsAuthorOrReadOnly, )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'feed', 'by_ingredients'):
+            return Recipe.objects.with_related(self.request.user)
+        return Recipe.objects.annotate_user_flags(self.request.user)
+
+    def get_validator_queryset(self):
+        queryset = super().get_validator_queryset()
+        if self.action == 'feed':
+            return queryset.from_followed(self.request.user)
+        return queryset
+
+    def get_timeline(self):
+        # Кэш ленты не учитывает фильтры, с ними лента берется из БД
+        if self.request.query_params.keys() - {'cursor', 'limit'}:
+            return None
+        return get_timeline(self.request.user)
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
+            if settings.FAST_SERIALIZERS:
+                return FastRecipeListSerializer
             return RecipeListSerializer
         return RecipeSerializer
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        serializer.save()
+        update_counters(User, self.request.user.id, recipes_count=1)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        lock_recipe(instance)
+        # Убираем рецепт из итогов списков покупок до каскадного удаления
+        update_recipe_cart_totals(
+            recipe=instance,
+            old_amounts=get_recipe_amounts(instance),
+            new_amounts={}
+        )
+        instance.delete()
+        update_counters(User, instance.author_id, recipes_count=-1)
+
     def _handle_post_request(self, request=None, serializer=None, user=None,
                              model=None, error_message=None, recipe=None):
         """
@@ -89,22 +154,38 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
         model = ShoppingCart
 
-        if request.method == 'POST':
-            return self._handle_post_request(
-                request=request,
-                serializer=ShoppingCartSerializer,
-                user=user,
-                model=model,
-                error_message='Рецепт уже есть в списке покупок',
-                recipe=recipe,
-            )
+        with transaction.atomic():
+            lock_recipe(recipe)
+            if request.method == 'POST':
+                response = self._handle_post_request(
+                    request=request,
+                    serializer=ShoppingCartSerializer,
+                    user=user,
+                    model=model,
+                    error_message='Рецепт уже есть в списке покупок',
+                    recipe=recipe,
+                )
+                sign = 1
+            else:
+                response = self._handle_delete_request(
+                    recipe=recipe,
+                    user=user,
+                    model=model,
+                    error_message='Рецепта не было в списке покупок'
+                )
+                sign = -1
 
-        return self._handle_delete_request(
-            recipe=recipe,
-            user=user,
-            model=model,
-            error_message='Рецепта не было в списке покупок'
-        )
+            if status.is_success(response.status_code):
+                update_counters(Recipe, recipe.id, cart_count=sign)
+                update_cart_totals(
+                    user_ids=[user.id],
+                    amounts={
+                        ingredient_id: sign * amount
+                        for ingredient_id, amount
+                        in get_recipe_amounts(recipe).items()
+                    }
+                )
+        return response
 
     @action(detail=True,
             methods=['post', 'delete'],
@@ -114,44 +195,157 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
         model = Favorite
 
-        if request.method == 'POST':
-            return self._handle_post_request(
-                request=request,
-                serializer=FavoriteSerializer,
-                user=user,
-                model=model,
-                error_message='Рецепт уже есть в избранном',
-                recipe=recipe,
+        with transaction.atomic():
+            if request.method == 'POST':
+                response = self._handle_post_request(
+                    request=request,
+                    serializer=FavoriteSerializer,
+                    user=user,
+                    model=model,
+                    error_message='Рецепт уже есть в избранном',
+                    recipe=recipe,
+                )
+                sign = 1
+            else:
+                response = self._handle_delete_request(
+                    recipe=recipe,
+                    user=user,
+                    model=model,
+                    error_message='Рецепта не было в избранном'
+                )
+                sign = -1
+
+            if status.is_success(response.status_code):
+                update_counters(Recipe, recipe.id, favorites_count=sign)
+        return response
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=[permissions.IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """
+        Рецепты авторов, на которых подписан пользователь, новые первыми.
+        Поддерживает фильтры списка рецептов, кроме ordering и search
+        (400): порядок ленты всегда по дате публикации.
+        """
+        return self.list(request)
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=[permissions.AllowAny],
+            pagination_class=CustomPagination)
+    def by_ingredients(self, request):
+        """
+        Подбор рецептов по продуктам ?ids=1,5,9: сначала рецепты, где
+        не хватает меньше ингредиентов, затем с большим числом совпадений.
+        """
+        try:
+            ingredient_ids = [
+                int(value) for value in request.query_params.get(
+                    'ids', '').split(',') if value.strip()
+            ]
+        except ValueError:
+            ingredient_ids = None
+        if not ingredient_ids:
+            return Response(
+                {'ids': 'Укажите id ингредиентов через запятую.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        return self._handle_delete_request(
-            recipe=recipe,
-            user=user,
-            model=model,
-            error_message='Рецепта не было в избранном'
+        page = self.paginate_queryset(
+            recipe_ingredient_index.rank(ingredient_ids)
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
         )
+        coverage = {
+            recipe_id: (covered, recipe_ingredient_index.get_missing(
+                recipe_id, ingredient_ids))
+            for recipe_id, covered, _ in page
+        }
+        serializer = TimedSerializer(RecipeCoverageSerializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page
+             if recipe_id in recipes],
+            many=True,
+            context={**self.get_serializer_context(), 'coverage': coverage}
+        ))
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False,
             methods=['get'],
-            permission_classes=[permissions.IsAuthenticated])
+            permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
+        """
+        Отдает список покупок по частям в формате из ?format=txt|csv|json.
+        """
         user = request.user
-        # Находим все компоненты пользователя
-        components = Component.objects.filter(recipe__shopping_cart__user=user)
-
-        ingredients = components.values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
+        # Итоги по ингредиентам поддерживаются при изменении списка покупок
+        ingredients = ShoppingCartTotal.objects.filter(user=user).values(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
 
-        content = create_content(ingredients=ingredients)
-        file_name = 'shopping_list.txt'
-        response = HttpResponse(content, content_type='text/plain')
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator()),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        file_name = f'shopping_list.{renderer.format}'
         response['Content-Disposition'] = f'attachment; filename={file_name}'
         return response
 
+    @action(detail=False,
+            methods=['post'],
+            permission_classes=[permissions.IsAuthenticated],
+            parser_classes=[NDJSONParser])
+    def bulk(self, request):
+        """
+        Пакетная загрузка рецептов текущего пользователя из NDJSON.
+        Возвращает число созданных рецептов и ошибки по номерам строк.
+        """
+        report = RecipeImporter(
+            author=request.user,
+            batch_size=settings.RECIPE_IMPORT_BATCH_SIZE,
+        ).run(request.data)
+        return Response(
+            report,
+            status=(status.HTTP_201_CREATED if report['created']
+                    else status.HTTP_400_BAD_REQUEST)
+        )
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=[NDJSONRenderer])
+    def export(self, request):
+        """Выгрузка рецептов (с учетом фильтров) в NDJSON по частям."""
+        queryset = self.filter_queryset(
+            Recipe.objects.annotate_user_flags(request.user)
+        )
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(export_recipes(queryset)),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = 'attachment; filename=recipes.ndjson'
+        return response
+
 
-class TagViewSet(mixins.ListModelMixin,
+class TagViewSet(MetricsMixin,
+                 CachedReferenceMixin,
+                 mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    reference_getter = staticmethod(get_tags)
+
+
+class MetricsView(APIView):
+    """Метрики маршрутов этого процесса для Prometheus (только админам)."""
+    permission_classes = (permissions.IsAdminUser,)
+    renderer_classes = (PrometheusRenderer,)
+
+    def get(self, request):
+        return Response(registry.render())
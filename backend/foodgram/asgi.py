@@ -1,7 +1,9 @@
 import os
 
-from django.core.asgi import get_asgi_application
+from api.async_views import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+# Под ASGI тяжелые по вводу-выводу эндпоинты работают асинхронно
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
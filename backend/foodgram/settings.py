@@ -39,6 +39,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.metrics_middleware',
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,6 +90,14 @@ DATABASES = {
                           default='5432')
     }
 }
+
+# Полнотекстовый поиск рецептов по столбцу tsvector с GIN-индексом есть
+# только в PostgreSQL, с другими СУБД используется индекс в памяти
+# (api.search): он догоняет изменения рецептов за несколько секунд
+# и отдает не больше SEARCH_FALLBACK_LIMIT лучших совпадений
+FULL_TEXT_SEARCH = 'postgresql' in DATABASES['default']['ENGINE']
+FULL_TEXT_SEARCH_CONFIG = 'russian'
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -95,6 +105,23 @@ DATABASES = {
 #     }
 # }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND',
+                             default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION',
+                              default='foodgram'),
+    }
+}
+
+# LocMemCache у каждого процесса свой, и смена версии справочника
+# (api.cache) не доходит до других воркеров. С таким кэшем метки версий
+# живут не дольше REFERENCE_CACHE_LOCAL_TIMEOUT секунд; для нескольких
+# воркеров задайте общий кэш через CACHE_BACKEND/CACHE_LOCATION
+# (FileBasedCache, Redis, Memcached)
+REFERENCE_CACHE_LOCAL_TIMEOUT = int(os.getenv('REFERENCE_CACHE_LOCAL_TIMEOUT',
+                                              default=60))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -136,6 +163,59 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Уменьшенные копии картинок рецептов строятся в пуле потоков
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+IMAGE_PROCESSING_SYNC = False
+# Максимальный размер картинки рецепта после декодирования base64
+IMAGE_MAX_UPLOAD_SIZE = int(os.getenv('IMAGE_MAX_UPLOAD_SIZE',
+                                      default=10 * 1024 * 1024))
+# Рецептов в пачке POST /api/recipes/bulk/. Картинки пачки декодируются
+# до записи в БД, в памяти держится до RECIPE_IMPORT_BATCH_SIZE картинок
+# по FILE_UPLOAD_MAX_MEMORY_SIZE байт (крупные пишутся во временные файлы)
+RECIPE_IMPORT_BATCH_SIZE = int(os.getenv('RECIPE_IMPORT_BATCH_SIZE',
+                                         default=20))
+
+# Лента /api/recipes/feed/ кэшируется для пользователей, у которых
+# не меньше FEED_CACHE_MIN_FOLLOWING подписок: FEED_CACHE_SIZE последних
+# рецептов на FEED_CACHE_TIMEOUT секунд
+FEED_CACHE_MIN_FOLLOWING = int(os.getenv('FEED_CACHE_MIN_FOLLOWING',
+                                         default=100))
+FEED_CACHE_SIZE = 500
+FEED_CACHE_TIMEOUT = 60
+
+# Списки рецептов и подписок отдаются быстрыми сериализаторами
+# (api.fast_serializers) с тем же JSON, что и обычные
+FAST_SERIALIZERS = os.getenv('FAST_SERIALIZERS', default='True') == 'True'
+
+# Ответы API от COMPRESSION_MIN_SIZE байт сжимаются
+# (api.compression): brotli, если установлен пакет Brotli, иначе gzip
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', default=1024))
+
+# Режим ASGI (foodgram.asgi включает ASYNC_VIEWS): все маршруты роутера
+# API обслуживаются асинхронными обертками (api.async_views), синхронный
+# код view идет в пул из ASYNC_VIEW_WORKERS потоков. Потоковые ответы
+# читаются в том же пуле кусками по 64 КиБ, в памяти на ответ не больше
+# ASYNC_STREAM_BUFFER кусков; поток занят, пока медленный клиент
+# не дочитает ответ до последних кусков
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='False') == 'True'
+ASYNC_VIEW_WORKERS = int(os.getenv('ASYNC_VIEW_WORKERS', default=8))
+ASYNC_STREAM_BUFFER = 4
+
+# Метрики запросов (api.metrics): последние METRICS_SAMPLE_SIZE замеров
+# на маршрут для квантилей, заголовок Server-Timing и бюджеты маршрутов
+# (время в секундах), превышение которых пишется в лог. Server-Timing
+# раскрывает любому клиенту число и время запросов к БД, поэтому
+# по умолчанию выключен и включается только для отладки
+METRICS_SAMPLE_SIZE = 1000
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING',
+                                  default='False') == 'True'
+METRICS_BUDGETS = {
+    'GET recipes-list': {'queries': 10, 'time': 0.3},
+    'GET recipes-detail': {'queries': 8, 'time': 0.2},
+    'GET recipes-download-shopping-cart': {'queries': 5, 'time': 0.5},
+    'GET users-subscriptions': {'queries': 10, 'time': 0.3},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -150,6 +230,17 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+
+    # orjson, если установлен, с тем же JSON, что у стандартных классов
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 AUTH_USER_MODEL = 'users.User'
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Component, Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from .models import (Component, Favorite, Ingredient, Recipe, RecipeTag,
+                     ShoppingCart, ShoppingCartTotal, Tag)
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -15,19 +16,20 @@ class ComponentsInline(admin.TabularInline):
     min_num = 1
 
 
+class TagsInline(admin.TabularInline):
+    """Класс для добавления тегов при создании рецептов через админку."""
+    model = RecipeTag
+    min_num = 1
+
+
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('id', 'author', 'name', 'text',
-                    'cooking_time', 'favorite_count')
-    inlines = (ComponentsInline,)
+                    'cooking_time', 'favorites_count', 'cart_count')
+    inlines = (ComponentsInline, TagsInline)
     search_fields = ('name', 'author__username', 'tags__name')
     list_filter = ('pub_date', 'author', 'name', 'tags')
     filter_horizontal = ('ingredients',)
 
-    def favorite_count(self, obj):
-        return obj.favorite.count()
-
-    favorite_count.short_description = 'Количество подписок'
-
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'color', 'slug',)
@@ -47,6 +49,11 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     search_fields = ('user',)
 
 
+class ShoppingCartTotalAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+    list_filter = ('user',)
+
+
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
     list_filter = ('user',)
@@ -58,4 +65,5 @@ admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Component, ComponentsAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(ShoppingCartTotal, ShoppingCartTotalAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
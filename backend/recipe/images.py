@@ -0,0 +1,111 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Размеры уменьшенных копий: имя -> (ширина, высота)
+IMAGE_VARIANTS = {
+    'small': (300, 300),
+    'medium': (720, 720),
+}
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """Пул потоков для обработки картинок, создается при первом вызове."""
+    return ThreadPoolExecutor(
+        max_workers=settings.IMAGE_WORKERS,
+        thread_name_prefix='recipe-images',
+    )
+
+
+def get_variant_name(image_name, variant, extension):
+    root, _ = os.path.splitext(image_name)
+    directory, file_name = os.path.split(root)
+    return os.path.join(
+        directory, 'variants', f'{file_name}_{variant}.{extension}'
+    )
+
+
+def save_image(image, name, format, **options):
+    buffer = BytesIO()
+    image.save(buffer, format=format, **options)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_variants(image_name):
+    """
+    Создает уменьшенные копии картинки в исходном формате (JPEG или PNG
+    с прозрачностью) и в WebP. Возвращает словарь {вариант: путь}.
+    """
+    with default_storage.open(image_name) as file:
+        original = Image.open(file)
+        original.load()
+
+    has_alpha = (original.mode in ('RGBA', 'LA')
+                 or 'transparency' in original.info)
+    original = original.convert('RGBA' if has_alpha else 'RGB')
+    format, extension = ('PNG', 'png') if has_alpha else ('JPEG', 'jpg')
+
+    variants = {}
+    for variant, size in IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        variants[variant] = save_image(
+            image, get_variant_name(image_name, variant, extension),
+            format, optimize=True
+        )
+        variants[f'{variant}_webp'] = save_image(
+            image, get_variant_name(image_name, variant, 'webp'),
+            'WEBP', quality=80, method=4
+        )
+    return variants
+
+
+def process_recipe_image(recipe_id, image_name):
+    """Задача пула: строит копии и сохраняет пути в Recipe.image_variants."""
+    from .models import Recipe
+
+    try:
+        variants = build_variants(image_name)
+        # Картинку могли заменить, пока задача ждала в очереди
+        Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+            image_variants=variants,
+            updated_at=timezone.now()
+        )
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', image_name)
+
+
+def run_in_worker(recipe_id, image_name):
+    try:
+        process_recipe_image(recipe_id, image_name)
+    finally:
+        # У каждого потока пула свое соединение с БД
+        connection.close()
+
+
+def schedule_image_variants(recipe):
+    """
+    Ставит обработку картинки рецепта в пул после фиксации транзакции.
+    С IMAGE_PROCESSING_SYNC = True обработка выполняется сразу.
+    """
+    recipe_id, image_name = recipe.id, recipe.image.name
+
+    def submit():
+        if settings.IMAGE_PROCESSING_SYNC:
+            process_recipe_image(recipe_id, image_name)
+        else:
+            get_executor().submit(run_in_worker, recipe_id, image_name)
+
+    transaction.on_commit(submit)
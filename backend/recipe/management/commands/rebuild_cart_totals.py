@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from recipe.models import Component, ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает итоги списков покупок из ShoppingCart '
+            'или проверяет их согласованность (--check).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить итоги с пересчитанными, ничего не меняя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create.',
+        )
+
+    def get_expected_totals(self):
+        rows = Component.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values(
+            'recipe__shopping_cart__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+        return {
+            (row['recipe__shopping_cart__user'], row['ingredient']):
+                row['total']
+            for row in rows
+        }
+
+    def handle(self, *args, **options):
+        expected = self.get_expected_totals()
+
+        if options['check']:
+            actual = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount
+                in ShoppingCartTotal.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount')
+            }
+            mismatches = [
+                (key, expected.get(key), actual.get(key))
+                for key in expected.keys() | actual.keys()
+                if expected.get(key) != actual.get(key)
+            ]
+            for (user_id, ingredient_id), need, have in mismatches:
+                self.stderr.write(
+                    f'user={user_id} ingredient={ingredient_id}: '
+                    f'ожидается {need}, в таблице {have}'
+                )
+            if mismatches:
+                raise CommandError(f'Расхождений: {len(mismatches)}')
+            self.stdout.write(self.style.SUCCESS(
+                f'Итоги согласованы ({len(expected)} строк)'))
+            return
+
+        with transaction.atomic():
+            ShoppingCartTotal.objects.all().delete()
+            ShoppingCartTotal.objects.bulk_create(
+                (
+                    ShoppingCartTotal(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount
+                    )
+                    for (user_id, ingredient_id), amount in expected.items()
+                ),
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги пересчитаны ({len(expected)} строк)'))
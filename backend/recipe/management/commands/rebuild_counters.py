@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from recipe.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribe, User
+
+# Счетчик: (модель, поле счетчика, модель связей, поле связи с моделью)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счетчики рецептов и пользователей '
+            'с таблицами связей и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти расхождения, ничего не меняя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_update.',
+        )
+
+    @staticmethod
+    def get_mismatches(model, field, related_model, related_field):
+        """Возвращает объекты model с неверным значением field."""
+        expected = dict(
+            related_model.objects.values(related_field).annotate(
+                total=Count('id')
+            ).values_list(related_field, 'total').order_by()
+        )
+        mismatches = []
+        for obj in model.objects.only('id', field).order_by().iterator():
+            value = expected.get(obj.id, 0)
+            if getattr(obj, field) != value:
+                mismatches.append((obj, getattr(obj, field), value))
+        return mismatches
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, field, related_model, related_field in COUNTERS:
+            with transaction.atomic():
+                mismatches = self.get_mismatches(
+                    model, field, related_model, related_field
+                )
+                for obj, have, need in mismatches:
+                    self.stderr.write(
+                        f'{model.__name__} id={obj.id} {field}: '
+                        f'ожидается {need}, в таблице {have}'
+                    )
+                    setattr(obj, field, need)
+                if not options['check']:
+                    model.objects.bulk_update(
+                        [obj for obj, _, _ in mismatches], [field],
+                        batch_size=options['batch_size']
+                    )
+            total += len(mismatches)
+
+        if options['check']:
+            if total:
+                raise CommandError(f'Расхождений: {total}')
+            self.stdout.write(self.style.SUCCESS('Счетчики согласованы'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны (исправлено {total})'))
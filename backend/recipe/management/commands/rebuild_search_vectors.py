@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recipe.models import Recipe
+from recipe.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает поисковые векторы всех рецептов (PostgreSQL), '
+            'например после изменения названий ингредиентов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько рецептов обновлять одним запросом.',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.FULL_TEXT_SEARCH:
+            raise CommandError(
+                'Полнотекстовый поиск доступен только с PostgreSQL.')
+
+        ids = Recipe.objects.order_by('id').values_list('id', flat=True)
+        batch_size = options['batch_size']
+        last_id = total = 0
+        while True:
+            batch = list(ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            update_search_vectors(batch)
+            last_id = batch[-1]
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковые векторы обновлены ({total} рецептов)'))
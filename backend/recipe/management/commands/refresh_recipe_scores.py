@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipe.popularity import refresh_scores
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинги рецептов для ?ordering=popular и '
+            '?ordering=trending. Запускается периодически (например, cron).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько рецептов пересчитывать за один проход.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        updated = refresh_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рейтингов: {updated} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
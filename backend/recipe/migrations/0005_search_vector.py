@@ -0,0 +1,37 @@
+import recipe.models
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+            'ON recipe_recipe USING gin (search_vector)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+    """
+    Поисковый вектор рецепта. Колонка есть во всех СУБД (tsvector
+    в PostgreSQL, текст в остальных), GIN-индекс по ней создается только
+    в PostgreSQL. После миграции векторы заполняются командой
+    rebuild_search_vectors.
+    """
+
+    dependencies = [
+        ('recipe', '0004_performance_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=recipe.models.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
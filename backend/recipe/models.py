@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
-from users.models import User
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.utils import timezone
+from users.models import Subscribe, User
 
 COLOR = (
     ('#FF0000', 'Красный'),
@@ -13,6 +16,101 @@ COLOR = (
 )
 
 
+class SearchVectorField(models.TextField):
+    """
+    Поисковый вектор: tsvector в PostgreSQL, в других СУБД пустая
+    текстовая колонка (поиск идет по индексу в памяти, см. api.search).
+    Схема от настроек не зависит, а сравнение с SearchQuery через @@
+    подключается только при полнотекстовом поиске.
+    """
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'tsvector'
+        return super().db_type(connection)
+
+
+if settings.FULL_TEXT_SEARCH:
+    from django.contrib.postgres.search import SearchVectorExact
+
+    SearchVectorField.register_lookup(SearchVectorExact)
+
+
+def is_subscribed_expression(user, author_ref):
+    """Флаг подписки user на автора, заданного OuterRef(author_ref)."""
+    if user.is_anonymous:
+        return Value(False, output_field=BooleanField())
+    return Exists(Subscribe.objects.filter(
+        user=user, author=OuterRef(author_ref)))
+
+
+class RecipeQuerySet(models.QuerySet):
+    # Поля, от которых зависит ответ API по рецепту (см. validator_values)
+    VALIDATOR_FIELDS = (
+        'id', 'pub_date', 'updated_at', 'is_favorited', 'is_in_shopping_cart',
+        'author_is_subscribed', 'author__email', 'author__username',
+        'author__first_name', 'author__last_name',
+        'popularity_score', 'trending_score',
+    )
+
+    def annotate_user_flags(self, user):
+        """
+        Добавляет к рецептам флаги is_favorited и is_in_shopping_cart
+        для пользователя одним запросом вместо EXISTS на каждый рецепт.
+        """
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def with_related(self, user):
+        """
+        План выборки для списка и страницы рецепта: автор с флагом
+        is_subscribed, теги и компоненты с ингредиентами подгружаются
+        фиксированным числом запросов независимо от размера страницы.
+        """
+        return self.annotate_user_flags(user).prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=is_subscribed_expression(user, 'pk')
+                ),
+            ),
+            'tags',
+            Prefetch(
+                'components',
+                queryset=Component.objects.select_related('ingredient'),
+            ),
+        )
+
+    def from_followed(self, user):
+        """Рецепты авторов, на которых подписан user."""
+        return self.filter(author__in=Subscribe.objects.filter(
+            user=user).values('author'))
+
+    def validator_values(self, user):
+        """
+        Легкая выборка полей, от которых зависит ответ, для ETag.
+        Ожидает queryset с annotate_user_flags. Аннотации, по которым
+        идет сортировка (например, search_rank), тоже попадают в выборку:
+        по ним курсорная пагинация строит позицию.
+        """
+        ordering_annotations = tuple(
+            field.lstrip('-') for field in self.query.order_by
+            if isinstance(field, str)
+            and field.lstrip('-') in self.query.annotations
+        )
+        return self.annotate(
+            author_is_subscribed=is_subscribed_expression(user, 'author')
+        ).values(*self.VALIDATOR_FIELDS, *ordering_annotations)
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -29,6 +127,12 @@ class Recipe(models.Model):
         verbose_name='Картинка',
         upload_to='media/',
     )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='Описание рецепта'
     )
@@ -40,6 +144,7 @@ class Recipe(models.Model):
     )
     tags = models.ManyToManyField(
         'Tag',
+        through='RecipeTag',
         verbose_name='Тег',
         related_name='recipies',
     )
@@ -51,11 +156,55 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    cart_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False,
+    )
+    popularity_score = models.FloatField(
+        verbose_name='Популярность',
+        default=0,
+        editable=False,
+    )
+    trending_score = models.FloatField(
+        verbose_name='Популярность за последние дни',
+        default=0,
+        editable=False,
+    )
+    # Название (A), ингредиенты (B) и описание (C), обновляется
+    # в recipe.search.update_search_vectors. GIN-индекс создает миграция
+    # 0005_search_vector только в PostgreSQL
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['-popularity_score', '-id'],
+                         name='recipe_popularity_id_idx'),
+            models.Index(fields=['-trending_score', '-id'],
+                         name='recipe_trending_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -88,6 +237,40 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeTag(models.Model):
+    """
+    Связь рецепта с тегом. Таблица та же, что у автоматической связи,
+    но с индексом (tag, recipe) для выборки рецептов по тегам.
+    """
+    recipe = models.ForeignKey(
+        'Recipe',
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+    )
+    tag = models.ForeignKey(
+        'Tag',
+        verbose_name='Тег',
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+        db_table = 'recipe_recipe_tags'
+        verbose_name = 'Тег рецепта'
+        verbose_name_plural = 'Теги рецептов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'tag'],
+                name='unique_recipe_tag')
+        ]
+        indexes = [
+            models.Index(fields=['tag', 'recipe'],
+                         name='recipe_tag_tag_recipe_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.tag}'
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         verbose_name='Название ингредиента',
@@ -105,6 +288,11 @@ class Ingredient(models.Model):
         ordering = ['id']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient')
+        ]
 
     def __str__(self):
         return self.name
@@ -155,6 +343,10 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт',
         on_delete=models.CASCADE,
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        default=timezone.now,
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -180,6 +372,10 @@ class Favorite(models.Model):
         related_name='favorite',
         on_delete=models.CASCADE,
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        default=timezone.now,
+    )
 
     class Meta:
         verbose_name = 'Избранные рецепты'
@@ -190,3 +386,35 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f'{self.recipe}'
+
+
+class ShoppingCartTotal(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+    Обновляется при изменении списка покупок и состава рецептов.
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_cart_totals',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='shopping_cart_totals',
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'ingredient'],
+            name='unique_user_ingredient_in_cart_total')]
+
+    def __str__(self):
+        return f'{self.ingredient} {self.amount}'
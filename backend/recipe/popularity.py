@@ -0,0 +1,83 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Favorite, Recipe, ShoppingCart
+
+# Вес добавления рецепта в избранное и в список покупок
+FAVORITE_WEIGHT = 2
+CART_WEIGHT = 1
+# Вклад добавления в trending_score убывает вдвое за TRENDING_HALF_LIFE,
+# добавления старше TRENDING_WINDOW не учитываются
+TRENDING_HALF_LIFE = timedelta(days=3)
+TRENDING_WINDOW = timedelta(days=30)
+
+
+def get_popularity(favorites_count, cart_count):
+    return FAVORITE_WEIGHT * favorites_count + CART_WEIGHT * cart_count
+
+
+def get_trending_scores(first_id, last_id, now):
+    """
+    Возвращает {recipe_id: trending_score} для рецептов с id от first_id
+    до last_id. Добавления за TRENDING_WINDOW группируются в БД по дням,
+    затухание считается по возрасту дня.
+    """
+    today = timezone.localdate(now)
+    half_life = TRENDING_HALF_LIFE / timedelta(days=1)
+    scores = defaultdict(float)
+    for model, weight in ((Favorite, FAVORITE_WEIGHT),
+                          (ShoppingCart, CART_WEIGHT)):
+        rows = model.objects.filter(
+            recipe_id__gte=first_id,
+            recipe_id__lte=last_id,
+            created__gte=now - TRENDING_WINDOW,
+        ).annotate(day=TruncDate('created')).values(
+            'recipe_id', 'day'
+        ).annotate(total=Count('id')).values_list(
+            'recipe_id', 'day', 'total'
+        ).order_by()
+        for recipe_id, day, total in rows:
+            # Возраст считаем от середины дня
+            age = (today - day).days + 0.5
+            scores[recipe_id] += weight * total * 0.5 ** (age / half_life)
+    return scores
+
+
+def refresh_scores(batch_size=1000, now=None):
+    """
+    Пересчитывает popularity_score (по денормализованным счетчикам)
+    и trending_score пачками по id, записывая только изменившиеся.
+    Возвращает число обновленных рецептов.
+    """
+    now = now or timezone.now()
+    last_id = updated = 0
+    while True:
+        recipes = list(Recipe.objects.filter(id__gt=last_id).order_by(
+            'id'
+        ).only(
+            'id', 'favorites_count', 'cart_count',
+            'popularity_score', 'trending_score'
+        )[:batch_size])
+        if not recipes:
+            return updated
+        last_id = recipes[-1].id
+        trending = get_trending_scores(recipes[0].id, last_id, now)
+
+        changed = []
+        for recipe in recipes:
+            scores = (
+                get_popularity(recipe.favorites_count, recipe.cart_count),
+                round(trending.get(recipe.id, 0), 4),
+            )
+            if scores != (recipe.popularity_score, recipe.trending_score):
+                recipe.popularity_score, recipe.trending_score = scores
+                changed.append(recipe)
+        # bulk_update не трогает updated_at: рейтинг не меняет сам рецепт
+        Recipe.objects.bulk_update(
+            changed, ['popularity_score', 'trending_score']
+        )
+        updated += len(changed)
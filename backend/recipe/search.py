@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from .models import Component, Recipe
+
+
+def get_search_vector():
+    """Взвешенный вектор рецепта: название, ингредиенты, описание."""
+    from django.contrib.postgres.aggregates import StringAgg
+    from django.contrib.postgres.search import SearchVector
+
+    config = settings.FULL_TEXT_SEARCH_CONFIG
+    ingredient_names = Component.objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(Subquery(ingredient_names), weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+def update_search_vectors(recipe_ids):
+    """Пересчитывает search_vector рецептов одним UPDATE."""
+    if not settings.FULL_TEXT_SEARCH or not recipe_ids:
+        return
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        search_vector=get_search_vector()
+    )
+
+
+def schedule_search_update(recipe_ids):
+    """
+    Обновляет поисковые векторы после фиксации транзакции, когда
+    компоненты рецептов уже записаны.
+    """
+    if settings.FULL_TEXT_SEARCH and recipe_ids:
+        transaction.on_commit(
+            lambda: update_search_vectors(list(recipe_ids))
+        )
@@ -4,7 +4,8 @@ from .models import Subscribe, User
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'email', 'username', 'first_name', 'last_name',)
+    list_display = ('id', 'email', 'username', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count',)
     search_fields = ('username', 'email')
     list_filter = ('username', 'email',)
 
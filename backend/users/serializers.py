@@ -51,20 +51,23 @@ class SubscribeSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count',)
 
     def get_is_subscribed(self, obj):
+        # Подписка выдается только ее владельцу, отдельный запрос не нужен
         user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(
-            user=user.id,
-            author=obj.author).exists()
+        return obj.user_id == user.id
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        recipes = obj.author.recipies.all()
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        # Рецепты всех авторов страницы выбраны заранее в subscriptions
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.author_id, [])
+        else:
+            request = self.context.get('request')
+            recipes_limit = request.GET.get('recipes_limit')
+            recipes = obj.author.recipies.all()
+            if recipes_limit:
+                recipes = recipes[:int(recipes_limit)]
         return RecipeForSubscribeSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
-        return obj.author.recipies.count()
+        # Счетчик денормализован в User.recipes_count
+        return obj.author.recipes_count
@@ -1,4 +1,11 @@
+from api.fast_serializers import FastSubscribeSerializer
+from api.feed import invalidate_timeline
+from api.metrics import TimedSerializer
+from api.mixins import MetricsMixin
 from api.pagination import CustomPagination
+from api.utils import get_recipes_by_author, update_counters
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from djoser.serializers import SetPasswordSerializer
 from rest_framework import permissions, status, viewsets
@@ -11,7 +18,7 @@ from .serializers import (SubscribeSerializer, UserCreateSerializer,
                           UserSerializer)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(MetricsMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     pagination_class = CustomPagination
     permission_classes = (permissions.AllowAny,)
@@ -70,7 +77,10 @@ class UserViewSet(viewsets.ModelViewSet):
                     {'errors': 'Подписка существует / подписка на себя'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            serializer.save(author=author, user=user)
+            with transaction.atomic():
+                serializer.save(author=author, user=user)
+                update_counters(User, author.id, followers_count=1)
+            invalidate_timeline(user.id)
             return Response(serializer.data,
                             status=status.HTTP_201_CREATED)
 
@@ -81,9 +91,12 @@ class UserViewSet(viewsets.ModelViewSet):
                 {'errors': 'Ошибка отписки (Вы не были подписаны)'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        Subscribe.objects.get(
-            user=user,
-            author=author).delete()
+        with transaction.atomic():
+            Subscribe.objects.get(
+                user=user,
+                author=author).delete()
+            update_counters(User, author.id, followers_count=-1)
+        invalidate_timeline(user.id)
         return Response(
             'Вы успешно отписаны',
             status=status.HTTP_204_NO_CONTENT
@@ -96,11 +109,25 @@ class UserViewSet(viewsets.ModelViewSet):
     def subscriptions(self, request):
         user = request.user
         subscribes = Subscribe.objects.filter(
-            user=user)
+            user=user
+        ).select_related('author')
         page = self.paginate_queryset(subscribes)
-        serializer = SubscribeSerializer(
+
+        recipes_limit = request.GET.get('recipes_limit')
+        recipes_by_author = get_recipes_by_author(
+            author_ids=[subscribe.author_id for subscribe in page],
+            limit=int(recipes_limit) if recipes_limit else None
+        )
+        serializer_class = (
+            FastSubscribeSerializer if settings.FAST_SERIALIZERS
+            else SubscribeSerializer
+        )
+        serializer = TimedSerializer(serializer_class(
             page,
             many=True,
-            context={'request': request}
-        )
+            context={
+                'request': request,
+                'recipes_by_author': recipes_by_author,
+            }
+        ))
         return self.get_paginated_response(serializer.data)